@@ -0,0 +1,64 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sentence_transformers import SentenceTransformer
+
+from embedding_store import encode_titles
+
+# compares the single model.encode call investigate.py used to make with length-bucketed encoding,
+# in this process and across process pools:
+#   python benchmark_encode.py --processes 1 2 4 8
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', default='all-MiniLM-L6-v2')
+parser.add_argument('--titles', default='../../static/data/cleaned_titles.csv')
+parser.add_argument('--limit', type=int, default=None)
+parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+parser.add_argument('--token-budget', type=int, default=8192)
+args = parser.parse_args()
+
+# **************
+# data read-in
+# **************
+
+titles = pd.read_csv(args.titles).title.dropna().drop_duplicates().tolist()[:args.limit]
+
+model = SentenceTransformer(args.model)
+
+# **************
+# benchmark
+# **************
+
+results = []
+
+started = time.monotonic()
+baseline = model.encode(titles)
+elapsed = time.monotonic() - started
+results.append({'method': 'model.encode (default)', 'processes': 1, 'seconds': elapsed, 'max_abs_diff': 0.0})
+
+for processes in args.processes:
+    started = time.monotonic()
+    vectors = encode_titles(
+        titles,
+        args.model,
+        model=model if processes == 1 else None,
+        processes=processes,
+        token_budget=args.token_budget,
+    )
+    elapsed = time.monotonic() - started
+
+    results.append({
+        'method': 'encode_titles',
+        'processes': processes,
+        'seconds': elapsed,
+        'max_abs_diff': float(np.abs(vectors - baseline).max()),
+    })
+
+results = pd.DataFrame(results)
+results['titles_per_second'] = len(titles) / results['seconds']
+results['speedup'] = results['seconds'].iloc[0] / results['seconds']
+
+print(f'\n{len(titles)} titles')
+print(results.to_string(index=False))
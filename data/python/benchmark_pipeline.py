@@ -0,0 +1,398 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from clustering import fit_clusters
+from embedding_store import encode_titles
+from helper_functions import ngram_counts
+from ingest import build_cache, cache_fingerprint, keep_clean_titles
+from keyword_groups import KEYWORD_GROUPS
+from keyword_matcher import build_keyword_matcher, tag_titles_sharded
+from label_cache import LabelCache, classify_with_cache
+from label_parser import build_label_parser, parse_labels
+from llm_runner import classify_titles_batched
+from mock_llm_server import start_mock_server
+from near_duplicates import near_duplicate_groups
+from prompts import COMBINED_CACHE_PROMPT, THEME_LABELS, TYPE_LABELS, combined_batch_prompt
+
+# times every stage of the pipeline, and the peak memory each one reaches, on synthetic exports shaped like
+# the real one, entirely offline: embeddings come from a tiny randomly initialized model built locally and
+# classification runs against mock_llm_server. results are written as JSON, one file per commit, so runs
+# can be compared across commits:
+#   python benchmark_pipeline.py --sizes 10000 100000
+#   python benchmark_pipeline.py --compare ../processed/benchmarks/<older commit>.json
+
+STAGES = ['ingest', 'clean', 'ngrams', 'keywords', 'near_duplicates', 'embed', 'cluster', 'classify', 'merge']
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+parser.add_argument('--titles', default='../../static/data/cleaned_titles.csv',
+                    help='real titles the synthetic ones are made from')
+parser.add_argument('--workdir', default='../processed/benchmarks',
+                    help='where generated corpora, the tiny model and results are kept')
+parser.add_argument('--output', default=None, help='results file (default: <workdir>/<commit>.json)')
+parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+parser.add_argument('--seed', type=int, default=42)
+parser.add_argument('--processes', type=int, default=1, help='processes for keyword tagging')
+parser.add_argument('--embedding-model', default=None,
+                    help='sentence-transformers model to embed with (default: a tiny local model)')
+parser.add_argument('--n-clusters', type=int, default=10)
+parser.add_argument('--llm-titles', type=int, default=20000,
+                    help='unique titles classified per corpus. past a few thousand the stub latency dominates')
+parser.add_argument('--llm-latency', type=float, default=0.05, help='seconds the stub takes per request')
+args = parser.parse_args()
+
+# bump when the generator changes, so corpora written by an older version are regenerated
+GENERATOR_VERSION = '1'
+
+
+# **************
+# synthetic corpora
+# **************
+
+URL_PREFIXES = [
+    'https://www.af.mil/News/Photos/igphoto/',
+    'https://www.army.mil/article/',
+    'https://www.marines.mil/photos?igphoto=',
+    'https://www.navy.mil/Resources/Photo-Gallery/igphoto/',
+    'https://www.defense.gov/Multimedia/Photos/igphoto/',
+]
+
+
+def synthetic_photos(source_titles, size, seed=42):
+    # (filename, title, url) rows built from real titles, so titles keep their lengths, vocabulary and
+    # keyword hits. a purge list repeats itself, so rows are exact copies, copies with one word swapped
+    # or a year added (e.g. yearly heritage month events), photo ids in place of titles, or missing
+    rng = np.random.default_rng(seed)
+    templates = [title.split() for title in source_titles]
+    vocab = [word for words in templates for word in words]
+
+    picks = rng.integers(len(templates), size=size)
+    kinds = rng.choice(5, size=size, p=[0.45, 0.25, 0.20, 0.07, 0.03])
+    swaps = rng.integers(len(vocab), size=size)
+    years = rng.integers(2008, 2026, size=size)
+    ids = rng.integers(10 ** 9, 2 * 10 ** 9, size=size)
+
+    for row in range(size):
+        words = templates[picks[row]]
+        kind = kinds[row]
+
+        if kind == 0:
+            title = ' '.join(words)
+        elif kind == 1:
+            position = swaps[row] % len(words)
+            title = ' '.join(words[:position] + [vocab[swaps[row]]] + words[position + 1:])
+        elif kind == 2:
+            title = f'{" ".join(words)} {years[row]}'
+        elif kind == 3:
+            title = f'{years[row] % 100:02d}{ids[row] % 10000:04d}-F-{ids[row] % 99991:05d}-{row % 1000:03d}'
+        else:
+            title = None
+
+        filename = f'{years[row] % 100:02d}{ids[row] % 10000:04d}-M-{ids[row] % 99991:05d}-{row % 10000:04d}.JPG'
+        url = f'{URL_PREFIXES[ids[row] % len(URL_PREFIXES)]}{ids[row]}'
+
+        yield filename, title, f'[{url}]({url})'
+
+
+def write_export(rows, path):
+    # the same layout as the raw export: {"rows": [{"columns": [filename, title, url]}, ...]}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('{"rows": [')
+        for position, row in enumerate(rows):
+            f.write((', ' if position else '') + json.dumps({'columns': list(row)}))
+        f.write(']}')
+    os.replace(tmp_path, path)
+
+
+def corpus_path(size):
+    # corpora are kept between runs, so every commit is benchmarked on the same files
+    path = os.path.join(args.workdir, 'corpora', f'photos_{size}_seed{args.seed}_v{GENERATOR_VERSION}.json')
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        print(f'generating {size} synthetic photos')
+        write_export(synthetic_photos(source_titles, size, args.seed), path)
+
+    return path
+
+
+# **************
+# tiny local model
+# **************
+
+def tiny_model_path(titles, vocab_size=8000, seed=42):
+    # a two-layer, 32-dimension BERT with random weights and a word-level vocab from the titles. it embeds
+    # nothing meaningful, but exercises tokenization, batching and encoding offline and far faster than a
+    # real model, and is the same from run to run
+    path = os.path.join(args.workdir, f'tiny_model_v{GENERATOR_VERSION}')
+    if os.path.exists(path):
+        return path
+
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    words = pd.Series([word for title in titles for word in title.lower().split()]).value_counts()
+    special = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]']
+
+    with tempfile.TemporaryDirectory() as bert_path:
+        with open(os.path.join(bert_path, 'vocab.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(special + words.index[:vocab_size - len(special)].tolist()) + '\n')
+        tokenizer = BertTokenizerFast(vocab_file=os.path.join(bert_path, 'vocab.txt'), do_lower_case=True)
+        tokenizer.save_pretrained(bert_path)
+
+        torch.manual_seed(seed)
+        BertModel(BertConfig(
+            vocab_size=len(tokenizer), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+            intermediate_size=64, max_position_embeddings=128,
+        )).save_pretrained(bert_path)
+
+        transformer = models.Transformer(bert_path, max_seq_length=64)
+        pooling = models.Pooling(transformer.get_word_embedding_dimension(), 'mean')
+        SentenceTransformer(modules=[transformer, pooling], device='cpu').save(path)
+
+    return path
+
+
+# **************
+# llm
+# **************
+
+def classify_stub(titles, base_url, cache_path):
+    # the combined classification cluster.py runs, through the label cache, against the stub
+    def categorize(texts, on_label):
+        return classify_titles_batched(
+            texts,
+            combined_batch_prompt,
+            {'theme': THEME_LABELS, 'type': TYPE_LABELS},
+            batch_size=20,
+            api_key='benchmark',
+            base_url=base_url,
+            on_label=lambda position, labels: on_label(position, json.dumps(labels)),
+            requests_per_second=1000,
+            desc='Classifying (stub)',
+        )
+
+    cache = LabelCache(cache_path)
+    try:
+        labels = classify_with_cache(titles, categorize, cache, COMBINED_CACHE_PROMPT, 'benchmark')
+    finally:
+        cache.close()
+
+    labels = [json.loads(label) if label else {} for label in labels]
+    return pd.DataFrame({
+        'title': titles,
+        'theme': [label.get('theme') for label in labels],
+        'type': [label.get('type') for label in labels],
+    })
+
+
+def merge_labels(clean_df, labelled):
+    # what cluster_analysis.py does with the classified titles: parse labels, merge onto every title, summarize
+    themes, _ = parse_labels(labelled['theme'], build_label_parser(THEME_LABELS), name='theme')
+    types, _ = parse_labels(labelled['type'], build_label_parser(TYPE_LABELS), name='type')
+    labelled = labelled.assign(theme=themes, type=types)
+
+    all_titles = clean_df[clean_df.title.notna()].merge(labelled, on='title', how='left')
+    summaries = [all_titles.groupby(column, observed=True).agg(count=('title', 'count')) for column in ['theme', 'type']]
+
+    return all_titles, summaries
+
+
+# **************
+# measurement
+# **************
+
+def reset_peak_memory():
+    # on linux a process can reset its peak RSS to its current RSS, so each stage's peak is its own.
+    # elsewhere the peak is the process-wide one so far
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def memory_mb():
+    # (current, peak) resident memory of this process. memory used by worker processes isn't included
+    try:
+        with open('/proc/self/status') as f:
+            status = dict(line.split(':', 1) for line in f)
+        return int(status['VmRSS'].split()[0]) / 1024, int(status['VmHWM'].split()[0]) / 1024
+    except (OSError, KeyError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / 1024 ** 2 if platform.system() == 'Darwin' else peak / 1024
+        return peak, peak
+
+
+def measure(name, run, results):
+    gc.collect()
+    reset_peak_memory()
+    start_rss, _ = memory_mb()
+
+    started = time.perf_counter()
+    output = run()
+    elapsed = time.perf_counter() - started
+
+    _, peak = memory_mb()
+    results[name] = {
+        'seconds': round(elapsed, 4),
+        'peak_rss_mb': round(peak, 1),
+        'peak_growth_mb': round(max(peak - start_rss, 0), 1),
+    }
+    print(f'  {name}: {elapsed:.2f}s, peak {peak:.0f} MB (+{max(peak - start_rss, 0):.0f} MB)')
+
+    return output
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+    return commit, dirty
+
+
+# **************
+# benchmark
+# **************
+
+def ingest_corpus(raw_path, cache_path):
+    # what load_photos does on a cache miss: clean the export chunk by chunk into the parquet cache, then
+    # read the cache back
+    build_cache(raw_path, cache_path, cache_fingerprint(raw_path))
+    return pd.read_parquet(cache_path)
+
+
+def run_corpus(size, stages):
+    raw_path = corpus_path(size)
+    results = {}
+    corpus = {'size': size, 'raw_mb': round(os.path.getsize(raw_path) / 1e6, 1), 'stages': results}
+    print(f'\n{size} photos')
+
+    # every stage needs the ones before it, so ingest and clean always run, and are only recorded if asked for
+    def stage(name, run):
+        return measure(name, run, results if name in stages else {})
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        photos = stage('ingest', lambda: ingest_corpus(raw_path, os.path.join(cache_dir, 'photos.parquet')))
+    clean_df = stage('clean', lambda: keep_clean_titles(photos))
+    unique_titles = clean_df['title'].dropna().drop_duplicates().astype(str).reset_index(drop=True)
+    corpus['clean_titles'] = len(clean_df)
+    corpus['unique_titles'] = len(unique_titles)
+
+    if 'ngrams' in stages:
+        stage('ngrams', lambda: ngram_counts(clean_df))
+
+    if 'keywords' in stages:
+        matcher = build_keyword_matcher(KEYWORD_GROUPS)
+        stage('keywords', lambda: tag_titles_sharded(clean_df['title'], matcher, processes=args.processes))
+
+    representatives = unique_titles
+    if 'near_duplicates' in stages:
+        groups = stage('near_duplicates', lambda: near_duplicate_groups(unique_titles))
+        representatives = unique_titles.iloc[np.unique(groups['representative'].to_numpy())]
+        corpus['near_duplicate_representatives'] = len(representatives)
+
+    embeddings = None
+    if 'embed' in stages or 'cluster' in stages:
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(embedding_model, device='cpu')
+        embeddings = stage('embed', lambda: encode_titles(representatives.tolist(), embedding_model, model=model))
+
+    if 'cluster' in stages:
+        stage('cluster', lambda: fit_clusters(embeddings, args.n_clusters, backend='kmeans'))
+
+    if 'classify' in stages or 'merge' in stages:
+        classify_titles = unique_titles.iloc[:args.llm_titles].tolist()
+        corpus['classified_titles'] = len(classify_titles)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            labelled = stage('classify', lambda: classify_stub(
+                classify_titles, base_url, os.path.join(cache_dir, 'label_cache.sqlite')
+            ))
+
+        if 'merge' in stages:
+            stage('merge', lambda: merge_labels(clean_df, labelled))
+
+    return corpus
+
+
+source_titles = pd.read_csv(args.titles).title.dropna().astype(str).tolist()
+
+# torch, transformers and sentence-transformers are only needed when something is embedded
+embedding_model = None
+if 'embed' in args.stages or 'cluster' in args.stages:
+    embedding_model = args.embedding_model or tiny_model_path(source_titles)
+
+server, base_url = start_mock_server(latency=args.llm_latency)
+
+commit, dirty = git_commit()
+report = {
+    'commit': commit,
+    'dirty': dirty,
+    'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'cpus': os.cpu_count(),
+    'settings': {
+        'seed': args.seed,
+        'generator_version': GENERATOR_VERSION,
+        'processes': args.processes,
+        'embedding_model': args.embedding_model or 'tiny',
+        'n_clusters': args.n_clusters,
+        'llm_titles': args.llm_titles,
+        'llm_latency': args.llm_latency,
+    },
+    'corpora': [run_corpus(size, args.stages) for size in args.sizes],
+}
+
+server.shutdown()
+
+# **************
+# save
+# **************
+
+output = args.output or os.path.join(args.workdir, f'{commit[:12]}{"-dirty" if dirty else ""}.json')
+os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+with open(output, 'w') as f:
+    json.dump(report, f, indent=2)
+print(f'\nwrote {output}')
+
+
+def stage_table(report):
+    return pd.DataFrame([
+        {'size': corpus['size'], 'stage': name, **measured}
+        for corpus in report['corpora']
+        for name, measured in corpus['stages'].items()
+    ]).set_index(['size', 'stage'])
+
+
+results = stage_table(report)
+
+if args.compare:
+    with open(args.compare) as f:
+        baseline = json.load(f)
+
+    # ratios above 1 are slower or bigger than the baseline commit
+    results = results.join(stage_table(baseline)[['seconds', 'peak_growth_mb']], rsuffix='_baseline', how='left')
+    results['time_ratio'] = results['seconds'] / results['seconds_baseline']
+    results['memory_ratio'] = results['peak_growth_mb'] / results['peak_growth_mb_baseline'].replace(0, np.nan)
+    print(f'compared with {baseline["commit"][:12]}{" (dirty)" if baseline.get("dirty") else ""}')
+
+print(results.to_string())
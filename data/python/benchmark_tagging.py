@@ -0,0 +1,55 @@
+import argparse
+import time
+
+import pandas as pd
+
+from keyword_groups import KEYWORD_GROUPS
+from keyword_matcher import build_keyword_matcher, tag_titles_sharded
+
+# times keyword tagging in one process and sharded across process pools, on the cleaned titles
+# repeated to stand in for many agencies' purge lists at once:
+#   python benchmark_tagging.py --repeat 20 --processes 1 2 4 8
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--titles', default='../../static/data/cleaned_titles.csv')
+parser.add_argument('--repeat', type=int, default=10)
+parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+args = parser.parse_args()
+
+# **************
+# data read-in
+# **************
+
+titles = pd.concat([pd.read_csv(args.titles).title] * args.repeat, ignore_index=True)
+
+matcher = build_keyword_matcher(KEYWORD_GROUPS)
+
+# **************
+# benchmark
+# **************
+
+results = []
+baseline = None
+
+for processes in args.processes:
+    started = time.monotonic()
+    tags, keyword_counts, matrix = tag_titles_sharded(titles, matcher, processes=processes)
+    elapsed = time.monotonic() - started
+
+    if baseline is None:
+        baseline = (tags, keyword_counts, matrix)
+
+    results.append({
+        'processes': processes,
+        'seconds': elapsed,
+        'matches_first_run': (
+            tags.equals(baseline[0]) and keyword_counts.equals(baseline[1]) and (matrix != baseline[2]).nnz == 0
+        ),
+    })
+
+results = pd.DataFrame(results)
+results['titles_per_second'] = len(titles) / results['seconds']
+results['speedup'] = results['seconds'].iloc[0] / results['seconds']
+
+print(f'\n{len(titles)} titles')
+print(results.to_string(index=False))
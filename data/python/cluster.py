@@ -1,69 +1,139 @@
 from api import api_key
-from openai import OpenAI
+import json
+import numpy as np
 import pandas as pd
 import os
-from tqdm import tqdm
-
-# set your OpenAI API key
-client = OpenAI(api_key=api_key)
+from embedding_store import EmbeddingStore
+from label_cache import LabelCache, cache_key, cached_labels, classify_with_cache
+from llm_metrics import MetricsLog, load_metrics, print_summary
+from llm_runner import classify_titles, classify_titles_batched
+from near_duplicates import near_duplicate_groups, propagate_labels
+from table_io import read_table, write_table
+from pre_classifier import pre_classify_missing
+from prompts import (theme_prompt, type_prompt, theme_batch_prompt, type_batch_prompt, combined_batch_prompt,
+                     THEME_CACHE_PROMPT, TYPE_CACHE_PROMPT, COMBINED_CACHE_PROMPT, THEME_LABELS, TYPE_LABELS)
 
 # **************
 # config
 # **************
 
-slight_redo = True
+model = "gpt-4o-mini"  # Use gpt-4 for best results
+
+# OpenAI-compatible endpoint to send requests to, None for OpenAI itself. 'http://127.0.0.1:8000/v1' points at
+# a local `python mock_llm_server.py --port 8000` for offline runs
+base_url = None
+
+# every label is cached here by (title, prompt, model), so reruns only pay for new titles or edited prompts
+label_cache_path = '../../data/processed/label_cache.sqlite'
+
+# labels are written to the cache as each reply arrives, so an interrupted run resumes with the titles still
+# missing. set to False to rebuild the CSVs from the cache alone, without calling the API
+classify_missing = True
+
+# tokens, latency and status of every LLM call, summarized per stage with `python llm_metrics.py`
+metrics_path = '../../data/processed/llm_calls.jsonl'
+
+# requests kept in flight at once, and the sustained request rate allowed by our OpenAI tier
+max_in_flight = 16
+requests_per_second = 8
+
+# titles packed into each request so the category instructions are sent once per batch (1 = one title per request)
+batch_size = 20
+
+# ask for theme and type in the same request, falling back to the separate prompts for titles it fails on
+combined = True
+
+# label titles locally from their embeddings when a classifier trained on the existing labels is at least
+# this confident, and only send the rest to the LLM. local labels are cached under their own model name and
+# marked 'local' in the theme_source and type_source columns
+pre_classify = True
+pre_classify_threshold = 0.9
+pre_classify_model = f'local-logreg@{pre_classify_threshold}'
+embedding_model = 'all-MiniLM-L6-v2'
+
+# classify one representative per group of near-duplicate titles (e.g. "Black History Month 2023" and
+# "Black History Month 2024") and copy its labels to the rest of the group
+collapse_near_duplicates = True
+near_duplicate_threshold = 0.8
 
 # **************
 # data read-in
 # **************
 
-clean_df = pd.read_csv('../../static/data/cleaned_titles.csv')
-
-unique_df = clean_df.drop_duplicates(subset=['title'])
+clean_df = read_table('../../static/data/cleaned_titles.csv')
 
+# titles like "NA" read back as missing, and are dropped downstream anyway
+unique_df = clean_df[clean_df.title.notna()].drop_duplicates(subset=['title'])
 
 # **************
-# theme categorization
+# label cache
 # **************
 
-def categorize_text_by_theme(text):
-
-    # Define the categorization prompt
-    prompt = f"""
-    You are a text categorization assistant. Your task is to categorize website titles from the military. The titles have recently been erased, and I want to group them into categories. You need to group each title into one of the following groups based on its content:
-
-    1. Black: Titles with events, figures, or topics related to Black people. For example, titles related to Black History Month, African Americans, Juneteenth, the Tuskegee Airmen, etc.
-    2. Women: Titles relating to women/females, including both women's cultural events like women's history month, and events specifically for/about female military personnel.
-    3. Hispanic: Titles with events, figures, or topics related to Hispanic/Latino people. For example, titles related to Hispanic Heritage Month, Hispanic soldiers, Latin food, fiestas, etc.
-    4. Native American: Titles with events, figures, or topics related to Native American/Indigenous people. For example, titles related to Native American Heritage Month, indigenous soldiers, the Navajo code talkers, powwows, various native tribes, etc.
-    5. Asian or Pacific Islander: Titles with events, figures, or topics related to Asian and Pacific Islander people. For example, titles related to Asian Heritage Month, Asian soldiers, Asian food, Luaus, etc.
-    6. LGBTQ+: Titles with events, figures, or topics related to LGBTQ+ people. For example, titles related to Pride Month, the LGBTQ+ community, the Stonewall Riots, etc. 
-    7. Other ethnicities & religions: Titles with events, figures, or topics related to other ethnicities and religions not mentioned above (e.g. not black, not hispanic, not native american, not asian, not pacific islander, not LGBTQ+). For example, titles related to Jewish Heritage Month, the Holocaust, Irish American Heritage, German American Heritage, Iraqi heritage, etc.
-    8. Generic DEI: Titles with events, figures, or topics related to diversity and inclusion, but not a specific racial or ethnic group. For example, titles related to diversity training, unconscious bias, equal employment, inclusivity, unspecified heritage, immigrants from unspecified places, barriers being broken, first-time achievements, etc.
-    9. Other: Titles that don't fit into any of the above categories. 
-
-    For each title, respond with just the  category name. Make sure to consider a title's context and meaning, and also whether titles were flagged for removal by accident. For example, a title about "Enola Gay" should be categorized as *LGBTQ+* because, even though it's about a plane, the plane's name has "gay" in it and that's probably why it was flagged. Another example: a title about "Vance Marchbanks" should be categorized as *Black* because, even though "black" isn't in the name, it's about a Black soldier.
-
-    Here's the title to categorize: "{text}"
-    """
-    
-    # Send the prompt to OpenAI's API
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",  # Use gpt-4 for best results
-        messages=[
-            {"role": "system", "content": prompt},
-        ]
-    )
-    
-    # Extract and return the response
-    return response.choices[0].message.content.strip()
+seed_label_cache = not os.path.exists(label_cache_path)
+label_cache = LabelCache(label_cache_path)
+
+metrics = MetricsLog(metrics_path)
+
+if seed_label_cache:
+    # carry over labels from earlier runs so they aren't paid for again. only the LLM's own labels count:
+    # local and near-duplicate guesses would otherwise come back as if the model had given them
+    for filename, column, prompt in [
+        ('../../static/data/theme_classified_titles.csv', 'theme', THEME_CACHE_PROMPT),
+        ('../../static/data/type_classified_titles.csv', 'type', TYPE_CACHE_PROMPT),
+    ]:
+        if os.path.exists(filename):
+            previous = read_table(filename).dropna(subset=['title', column])
+            if f'{column}_source' in previous:
+                previous = previous[previous[f'{column}_source'] == 'llm']
+            if 'near_duplicate_of' in previous:
+                # copied from a near-duplicate, which older CSVs only record here
+                previous = previous[previous['near_duplicate_of'].isna()]
+            previous = previous.drop_duplicates(subset=['title'], keep='last')
+            label_cache.put_many([
+                (cache_key(title, prompt, model), title, model, label)
+                for title, label in zip(previous['title'], previous[column])
+            ])
+
+    print(f'seeded label cache with {len(label_cache)} labels')
 
 
-if not os.path.exists('../../static/data/theme_classified_titles.csv'):
-    tqdm.pandas(desc="Categorizing title themes")
-    unique_df['theme'] = unique_df['title'].progress_apply(categorize_text_by_theme)
+# **************
+# theme categorization
+# **************
 
-    unique_df.to_csv('../../static/data/theme_classified_titles.csv', index=False)
+def categorize_text_by_theme(texts, on_label=None, desc="Categorizing title themes"):
+    # classify titles concurrently, returning one theme per title in input order
+    if batch_size > 1:
+        return classify_titles_batched(
+            texts,
+            theme_batch_prompt,
+            THEME_LABELS,
+            build_prompt=theme_prompt,
+            batch_size=batch_size,
+            model=model,
+            api_key=api_key,
+            base_url=base_url,
+            on_label=on_label,
+            max_in_flight=max_in_flight,
+            requests_per_second=requests_per_second,
+            metrics=metrics,
+            stage='theme',
+            desc=desc,
+        )
+
+    return classify_titles(
+        texts,
+        theme_prompt,
+        model=model,
+        api_key=api_key,
+        base_url=base_url,
+        on_label=on_label,
+        max_in_flight=max_in_flight,
+        requests_per_second=requests_per_second,
+        metrics=metrics,
+        stage='theme',
+        desc=desc,
+    )
 
 
 # **************
@@ -71,106 +141,208 @@ if not os.path.exists('../../static/data/theme_classified_titles.csv'):
 # **************
 
 
-def categorize_text_by_type(text):
-
-    # Define the categorization prompt
-    prompt = f"""
-    You are a text categorization assistant. Your task is to categorize website titles from the military. The titles have recently been erased, and I want to group them into categories. You need to group each title into one of the following groups based on its content:
+def categorize_text_by_type(texts, on_label=None, desc="Categorizing title types"):
+    # classify titles concurrently, returning one type per title in input order
+    if batch_size > 1:
+        return classify_titles_batched(
+            texts,
+            type_batch_prompt,
+            TYPE_LABELS,
+            build_prompt=type_prompt,
+            batch_size=batch_size,
+            model=model,
+            api_key=api_key,
+            base_url=base_url,
+            on_label=on_label,
+            max_in_flight=max_in_flight,
+            requests_per_second=requests_per_second,
+            metrics=metrics,
+            stage='type',
+            desc=desc,
+        )
+
+    return classify_titles(
+        texts,
+        type_prompt,
+        model=model,
+        api_key=api_key,
+        base_url=base_url,
+        on_label=on_label,
+        max_in_flight=max_in_flight,
+        requests_per_second=requests_per_second,
+        metrics=metrics,
+        stage='type',
+        desc=desc,
+    )
 
-    1. Explicit heritage and DEI events: Titles that celebrate a specific heritage month or event, or an explicit Diversity, Equity, and Inclusion (DEI) program. For example, titles related to Black History Month, Hispanic Heritage Month, Native American Heritage Month, Asian Heritage Month, Inclusivity workshops, etc.
-    2. Everyday celebrations of heritage or ethnicity: Titles that mention activities or celebrations related to a specific heritage group without explicitly mentioning a heritage month or event. For example, titles related to Asian food, gospel music, female-led movies, fiestas, powwows, etc.
-    3. Mentions of personnel that highlight their ethnicity: any mentions of military personnel that call out the fact that these personnel are black, hispanic, native american, asian, etc.
-    4. Military personnel that belong to a specific ethnic group, even if that isn't explicitly mentioned: Titles that mention military personnel who happen to a specific heritage group, even if that isn't in the title. For example, titles like Vance Marchbanks (who is black), the code talkers (who are native American), Nishimoto (who is asian), Eric Fanning (who is gay), etc.
-    5. Facts of history that relate to a specific ethnic group: Titles that mention facts of history that relate to a specific ethnic group. For example, titles related to slavery, the civil rights movement, the holocaust (but not an official observence event, which would be in category #1), the niagara movement, etc.
-    6. Other: Titles that don't fit into any of the above categories.
 
-    For each title, respond with just the  category name (don't include the number).
+# **************
+# combined categorization
+# **************
 
-    Here's the title to categorize: "{text}"
-    """
-    
-    # Send the prompt to OpenAI's API
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",  # Use gpt-4 for best results
-        messages=[
-            {"role": "system", "content": prompt},
-        ]
+def categorize_text_by_theme_and_type(texts, on_label=None, desc="Categorizing title themes and types"):
+    # one request returns both labels for each title, passed on as a JSON string so it can be cached whole.
+    # titles that don't get a valid theme and type come back as None
+    return classify_titles_batched(
+        texts,
+        combined_batch_prompt,
+        {'theme': THEME_LABELS, 'type': TYPE_LABELS},
+        batch_size=batch_size,
+        model=model,
+        api_key=api_key,
+        base_url=base_url,
+        on_label=None if on_label is None else lambda position, labels: on_label(position, json.dumps(labels)),
+        max_in_flight=max_in_flight,
+        requests_per_second=requests_per_second,
+        metrics=metrics,
+        stage='combined',
+        desc=desc,
     )
 
-    # Extract and return the response
-    return response.choices[0].message.content.strip()
-
 
-# run in chunks to avoid timeouts
-chunk_size = 250  # Process 250 titles at a time
-num_chunks = len(unique_df) // chunk_size + (1 if len(unique_df) % chunk_size != 0 else 0)
+# **************
+# classification
+# **************
 
-print(f"Processing {len(unique_df)} titles in {num_chunks} chunks of {chunk_size}")
+# the cache is keyed on the instructions and title templates, so one-title and batched prompts reuse each
+# other's labels
+theme_df = unique_df.copy()
+theme_df['theme'] = cached_labels(theme_df['title'], label_cache, THEME_CACHE_PROMPT, model)
 
-# Initialize an empty dataframe to collect all processed chunks
-all_processed_df = pd.DataFrame()
+type_df = unique_df.copy()
+type_df['type'] = cached_labels(type_df['title'], label_cache, TYPE_CACHE_PROMPT, model)
 
-total_na = 0
+if combined:
+    # labels from earlier combined requests, so they're known before pre-classification decides what's missing
+    both = cached_labels(unique_df['title'], label_cache, COMBINED_CACHE_PROMPT, model)
+    both = [json.loads(labels) if labels else {} for labels in both]
 
-# Process each chunk
-for i in range(num_chunks):
-    start_idx = i * chunk_size
-    end_idx = min((i + 1) * chunk_size, len(unique_df))
+    theme_df['theme'] = theme_df['theme'].fillna(
+        pd.Series([labels.get('theme') for labels in both], index=theme_df.index, dtype=object)
+    )
+    type_df['type'] = type_df['type'].fillna(
+        pd.Series([labels.get('type') for labels in both], index=type_df.index, dtype=object)
+    )
 
-    print(f"Processing chunk {i+1}/{num_chunks} (titles {start_idx}-{end_idx-1})")
+if collapse_near_duplicates:
+    # members take their representative's label, so only representatives are classified
+    near_duplicates = near_duplicate_groups(unique_df['title'], near_duplicate_threshold)
+    to_classify = (near_duplicates['representative'] == np.arange(len(unique_df))).to_numpy()
+
+    theme_from_representative = theme_df['theme'].isna().to_numpy() & ~to_classify
+    type_from_representative = type_df['type'].isna().to_numpy() & ~to_classify
+
+    theme_df['theme'] = propagate_labels(theme_df['theme'], near_duplicates)
+    type_df['type'] = propagate_labels(type_df['type'], near_duplicates)
+else:
+    to_classify = np.ones(len(unique_df), dtype=bool)
+    theme_from_representative = type_from_representative = np.zeros(len(unique_df), dtype=bool)
+
+theme_local = np.zeros(len(unique_df), dtype=bool)
+type_local = np.zeros(len(unique_df), dtype=bool)
+
+# fully cached reruns skip embedding and pre-classification
+missing_any = ((theme_df['theme'].isna() | type_df['type'].isna()) & to_classify).to_numpy().any()
+
+if pre_classify and missing_any and not classify_missing:
+    # rebuilding from the cache alone: reuse the local labels the last run saved instead of embedding
+    # and training again
+    for df, column, prompt, local in [
+        (theme_df, 'theme', THEME_CACHE_PROMPT, theme_local),
+        (type_df, 'type', TYPE_CACHE_PROMPT, type_local),
+    ]:
+        missing = (df[column].isna() & to_classify).to_numpy()
+        df.loc[missing, column] = cached_labels(df.loc[missing, 'title'], label_cache, prompt, pre_classify_model)
+        local[:] = missing & df[column].notna().to_numpy()
+
+    print(f'reused {theme_local.sum()} themes and {type_local.sum()} types from earlier pre-classification')
+elif pre_classify and missing_any:
+    # titles the local classifiers are confident about never reach the LLM
+    embeddings = EmbeddingStore('../../data/processed/embeddings', model_name=embedding_model).embed(
+        unique_df.loc[to_classify, 'title']
+    )
 
-    # Get the current chunk
-    chunk_df = unique_df.iloc[start_idx:end_idx].copy()
+    theme_missing = theme_df['theme'].isna().to_numpy()
+    theme_df.loc[to_classify, 'theme'], themes_saved = pre_classify_missing(
+        embeddings, theme_df.loc[to_classify, 'theme'], THEME_LABELS, pre_classify_threshold, name='theme'
+    )
+    type_missing = type_df['type'].isna().to_numpy()
+    type_df.loc[to_classify, 'type'], types_saved = pre_classify_missing(
+        embeddings, type_df.loc[to_classify, 'type'], TYPE_LABELS, pre_classify_threshold, name='type'
+    )
 
-    # Check if this chunk was already processed
-    chunk_file = f"../../data/processed/title_chunks/type_chunk_{i+1}.csv"
-    if os.path.exists(chunk_file):
-        print(f"Loading already processed chunk {i+1} from {chunk_file}")
-        processed_chunk = pd.read_csv(chunk_file)
+    # local labels are cached apart from the LLM's, under the pre-classifier's own model name
+    for df, column, prompt, missing, local in [
+        (theme_df, 'theme', THEME_CACHE_PROMPT, theme_missing, theme_local),
+        (type_df, 'type', TYPE_CACHE_PROMPT, type_missing, type_local),
+    ]:
+        local[:] = missing & df[column].notna().to_numpy()
+        label_cache.put_many([
+            (cache_key(title, prompt, pre_classify_model), title, pre_classify_model, label)
+            for title, label in zip(df.loc[local, 'title'], df.loc[local, column])
+        ])
+
+    print(f'pre-classification saved {themes_saved + types_saved} title classifications '
+          f'(about {(themes_saved + types_saved) // max(batch_size, 1)} API calls at batch size {batch_size})')
+
+if combined:
+    # titles missing either label get both from one request
+    missing = ((theme_df['theme'].isna() | type_df['type'].isna()) & to_classify).to_numpy()
+    both = classify_with_cache(
+        unique_df.loc[missing, 'title'], categorize_text_by_theme_and_type if classify_missing else None, label_cache,
+        COMBINED_CACHE_PROMPT, model
+    )
+    both = [json.loads(labels) if labels else {} for labels in both]
 
-        print(f'nas in chunk: {processed_chunk.type.isna().sum()}')
-        total_na += processed_chunk.type.isna().sum()
-    else:
-        # Process this chunk
-        tqdm.pandas(desc=f"Categorizing titles in chunk {i+1}/{num_chunks}")
-        chunk_df['type'] = chunk_df['title'].progress_apply(categorize_text_by_type)
-        
-        # Save this chunk
-        chunk_df.to_csv(chunk_file, index=False)
-        processed_chunk = chunk_df
-    
-    print(f"Completed and saved chunk {i+1}/{num_chunks}")
+    theme_df.loc[missing, 'theme'] = theme_df.loc[missing, 'theme'].fillna(
+        pd.Series([labels.get('theme') for labels in both], index=theme_df.index[missing], dtype=object)
+    )
+    type_df.loc[missing, 'type'] = type_df.loc[missing, 'type'].fillna(
+        pd.Series([labels.get('type') for labels in both], index=type_df.index[missing], dtype=object)
+    )
 
-    # Append to the full results
-    all_processed_df = pd.concat([all_processed_df, processed_chunk], ignore_index=True)
-        
-# Save the complete dataset
-all_processed_df.to_csv('../../static/data/type_classified_titles.csv', index=False)
+# anything still unlabeled goes through the separate theme and type prompts
+missing_theme = (theme_df['theme'].isna() & to_classify).to_numpy()
+theme_df.loc[missing_theme, 'theme'] = classify_with_cache(
+    theme_df.loc[missing_theme, 'title'], categorize_text_by_theme if classify_missing else None, label_cache,
+    THEME_CACHE_PROMPT, model
+)
 
-print("All chunks processed and combined into final output file")
+missing_type = (type_df['type'].isna() & to_classify).to_numpy()
+type_df.loc[missing_type, 'type'] = classify_with_cache(
+    type_df.loc[missing_type, 'title'], categorize_text_by_type if classify_missing else None, label_cache,
+    TYPE_CACHE_PROMPT, model
+)
 
-if slight_redo:
-    missing_chunk_filename = '../../data/processed/title_chunks/missing_titles_chunk.csv'
-    if os.path.exists(missing_chunk_filename):
-        print('no missing titles to categorize')
-        missing_titles = pd.read_csv(missing_chunk_filename)
+if collapse_near_duplicates:
+    # copy the new labels to near-duplicates, recording which representative each copied label came from
+    theme_df['theme'] = propagate_labels(theme_df['theme'], near_duplicates)
+    type_df['type'] = propagate_labels(type_df['type'], near_duplicates)
 
-    else:
-         
-        print('classifying missing titles...')
-        prev_df = pd.read_csv('../../static/data/type_classified_titles.csv')
+    for df, from_representative in [(theme_df, theme_from_representative), (type_df, type_from_representative)]:
+        df['near_duplicate_of'] = near_duplicates['representative_title'].where(from_representative)
+        df['near_duplicate_similarity'] = near_duplicates['similarity'].where(from_representative)
 
-        missing_titles = unique_df[~unique_df['title'].isin(prev_df['title'])]
-        
-        print(f'missing titles: {len(missing_titles)}')
+    print(f'labels copied from near-duplicates: {theme_from_representative.sum()} themes, '
+          f'{type_from_representative.sum()} types')
 
-        tqdm.pandas(desc="Categorizing missing titles")
-        missing_titles['type'] = missing_titles['title'].progress_apply(categorize_text_by_type)
+# where each label came from: the LLM (or its cache), the local pre-classifier, or a near-duplicate's label
+for df, column, local, from_representative in [
+    (theme_df, 'theme', theme_local, theme_from_representative),
+    (type_df, 'type', type_local, type_from_representative),
+]:
+    source = np.select([from_representative, local], ['near_duplicate', 'local'], 'llm').astype(object)
+    source[df[column].isna().to_numpy()] = None
+    df.insert(df.columns.get_loc(column) + 1, f'{column}_source', source)
 
-        missing_titles.to_csv(missing_chunk_filename, index=False)
+print(f'titles without a theme: {theme_df.theme.isna().sum()}')
+print(f'titles without a type: {type_df.type.isna().sum()}')
 
+write_table(theme_df, '../../static/data/theme_classified_titles.csv')
 
-    all_processed_df = pd.concat([all_processed_df, missing_titles], ignore_index=True)
+write_table(type_df, '../../static/data/type_classified_titles.csv')
 
-    all_processed_df.to_csv('../../static/data/type_classified_titles.csv', index=False)
+label_cache.close()
 
+metrics.close()
+print_summary(load_metrics(metrics_path, metrics.run))
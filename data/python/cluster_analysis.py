@@ -1,11 +1,13 @@
-import pandas as pd
+from table_io import read_table, write_table
+from label_parser import build_label_parser, parse_labels
+from prompts import THEME_LABELS, TYPE_LABELS
 
 # **************
 # data read-in
 # **************
 
-df_themes = pd.read_csv('../../static/data/theme_classified_titles.csv')
-df_types = pd.read_csv('../../static/data/type_classified_titles.csv')
+df_themes = read_table('../../static/data/theme_classified_titles.csv')
+df_types = read_table('../../static/data/type_classified_titles.csv')
 
 # **************
 # clean up
@@ -13,46 +15,47 @@ df_types = pd.read_csv('../../static/data/type_classified_titles.csv')
 
 df_themes = df_themes[df_themes.title.notna()]
 
-# Replace asterisks and numbers with empty strings
-df_themes['theme'] = (df_themes['theme']
-               .str.replace(r'\*', '', regex=True)
-               .str.replace(r'\d+', '', regex=True)
-               .str.replace('.', '')
-               .str.lstrip())
-
 df_types = df_types[df_types.title.notna()]
 
-df_types['type'] = (df_types['type']
-               .str.replace(r'(^|(?<=\s))4($|(?=\s))', "Military personnel that belong to a specific ethnic group, even if that isn't explicitly mentioned", regex=True)
-               .str.replace(r'\*', '', regex=True)
-               .str.replace(r'\d+', '', regex=True)
-               .str.replace('.', '')
-               .str.lstrip()
-               .str.replace('Inclusive heritage and DEI events', 'Explicit heritage and DEI events')
-               .str.replace(r'(^|(?<=\s))Military personnel that belong to a specific ethnic group($|(?=\s))', "Military personnel that belong to a specific ethnic group, even if that isn't explicitly mentioned", regex=True))
+# map raw model responses (e.g. "*Women*", "9. Other", a bare "4") to the prompt's categories in one pass
+theme_parser = build_label_parser(THEME_LABELS)
+
+type_parser = build_label_parser(
+    TYPE_LABELS,
+    aliases={
+        # labels from earlier versions of the type prompt
+        'Inclusive heritage and DEI events': 'Explicit heritage and DEI events',
+        'Military personnel that belong to a specific ethnic group': "Military personnel that belong to a specific ethnic group, even if that isn't explicitly mentioned",
+    },
+)
+
+df_themes['theme'], theme_rejects = parse_labels(df_themes['theme'], theme_parser, name='theme')
 
 # map to simpler types
-df_types['type'] = df_types['type'].replace(
-    {
+df_types['type'], type_rejects = parse_labels(
+    df_types['type'],
+    type_parser,
+    display_names={
         "Everyday celebrations of heritage or ethnicity": "Everyday celebrations",
         "Mentions of personnel that highlight their ethnicity": "Military personnel - identity mentioned",
         "Military personnel that belong to a specific ethnic group, even if that isn't explicitly mentioned": "Military personnel - no stated identity",
         "Facts of history that relate to a specific ethnic group": "Facts of history",
-    }
+    },
+    name='type',
 )
 
 # **************
 # analysis
 # **************
 
-summary_themes = df_themes.groupby('theme').agg(
+summary_themes = df_themes.groupby('theme', observed=True).agg(
     count = ('title', 'count')
 )
 summary_themes['share'] = summary_themes['count'] / summary_themes['count'].sum()
 
 summary_themes.sort_values(by='count', ascending=False)
 
-summary_types = df_types.groupby('type').agg(
+summary_types = df_types.groupby('type', observed=True).agg(
     count = ('title', 'count')
 )
 summary_types['share'] = summary_types['count'] / summary_types['count'].sum()
@@ -63,7 +66,7 @@ summary_types.sort_values(by='count', ascending=False)
 # merge with all titles
 # **************
 
-all_titles = pd.read_csv('../../static/data/cleaned_titles.csv')
+all_titles = read_table('../../static/data/cleaned_titles.csv')
 
 all_titles = all_titles[all_titles.title.notna()]
 
@@ -77,7 +80,7 @@ all_titles = all_titles.merge(
     how='left'
 )
 
-summary = all_titles.groupby(['theme', 'type']).agg(
+summary = all_titles.groupby(['theme', 'type'], observed=True).agg(
     count = ('title', 'count')
 )
 summary['share'] = summary['count'] / summary['count'].sum()
@@ -88,4 +91,4 @@ summary.sort_values(by='count', ascending=False)
 # save
 # **************
 
-all_titles.to_csv('../../static/data/cleaned_titles_with_themes_and_types.csv', index=False)
\ No newline at end of file
+write_table(all_titles, '../../static/data/cleaned_titles_with_themes_and_types.csv')
\ No newline at end of file
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+
+# **************
+# fitting
+# **************
+
+def make_clusterer(k, backend='minibatch', random_state=42):
+    # full-batch KMeans matches what investigate.py always did; MiniBatchKMeans scales to far more titles
+    if backend == 'kmeans':
+        return KMeans(n_clusters=k, random_state=random_state)
+    if backend == 'minibatch':
+        return MiniBatchKMeans(n_clusters=k, random_state=random_state, batch_size=4096, n_init=3)
+
+    raise ValueError(f'unknown clustering backend: {backend}')
+
+
+def sample_rows(embeddings, sample_size, random_state=42):
+    if sample_size is None or len(embeddings) <= sample_size:
+        return np.asarray(embeddings)
+
+    rows = np.random.default_rng(random_state).choice(len(embeddings), sample_size, replace=False)
+    return np.asarray(embeddings[np.sort(rows)])
+
+
+def score_k(sample, k, backend='minibatch', random_state=42):
+    # fit on the sample and score it, so every k costs the same no matter how big the corpus is
+    clusterer = make_clusterer(k, backend, random_state).fit(sample)
+
+    return {
+        'k': k,
+        'inertia': clusterer.inertia_,
+        'silhouette': silhouette_score(sample, clusterer.labels_, random_state=random_state),
+    }
+
+
+def sweep_k(embeddings, ks=range(4, 21), sample_size=10000, backend='minibatch', n_jobs=-1, random_state=42):
+    # score every k in parallel on one shared sample of the embeddings
+    sample = sample_rows(embeddings, sample_size, random_state)
+    scores = Parallel(n_jobs=n_jobs)(delayed(score_k)(sample, k, backend, random_state) for k in ks)
+
+    return pd.DataFrame(scores).sort_values('k').reset_index(drop=True)
+
+
+def pick_k(scores):
+    # the k with the best silhouette
+    return int(scores.loc[scores['silhouette'].idxmax(), 'k'])
+
+
+def fit_clusters(embeddings, k, backend='minibatch', random_state=42):
+    return make_clusterer(k, backend, random_state).fit(embeddings)
+
+
+# **************
+# persistence and incremental assignment
+# **************
+
+def save_centroids(clusterer, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    np.save(path, clusterer.cluster_centers_.astype(np.float32))
+
+
+def load_centroids(path):
+    return np.load(path)
+
+
+def assign_clusters(embeddings, centroids, chunk_size=65536):
+    # nearest centroid for each embedding, in chunks so memory stays bounded, without refitting
+    centroids = np.asarray(centroids, dtype=np.float32)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+
+    labels = np.empty(len(embeddings), dtype=np.int64)
+    for start in range(0, len(embeddings), chunk_size):
+        chunk = np.asarray(embeddings[start:start + chunk_size], dtype=np.float32)
+        # squared distance up to a per-row constant: |c|^2 - 2 x.c
+        labels[start:start + chunk_size] = (centroid_norms - 2 * chunk @ centroids.T).argmin(axis=1)
+
+    return labels
@@ -0,0 +1,231 @@
+import hashlib
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+
+# **************
+# encoding
+# **************
+
+def approximate_tokens(title):
+    # word pieces are close to words plus punctuation, plus the two special tokens
+    return len(re.findall(r'\w+|[^\w\s]', title)) + 2
+
+
+def plan_batches(lengths, token_budget=8192, min_batch_size=16, max_batch_size=1024):
+    # split length-sorted titles into batches of roughly token_budget padded tokens, so short titles go
+    # in big batches and long ones in small batches. returns (start, end) slices of the sorted order
+    batches = []
+    start = 0
+    while start < len(lengths):
+        end = start + 1
+        while end < len(lengths) and end - start < max_batch_size and (
+            end - start < min_batch_size or (end - start + 1) * lengths[end] <= token_budget
+        ):
+            end += 1
+        batches.append((start, end))
+        start = end
+
+    return batches
+
+
+_worker_model = None
+
+
+def _load_worker_model(model_name, threads):
+    global _worker_model
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    # split the cores between workers instead of every worker grabbing all of them
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_batch(titles):
+    return _worker_model.encode(titles, batch_size=len(titles))
+
+
+def encode_titles(titles, model_name='all-MiniLM-L6-v2', model=None, processes=1, token_budget=8192):
+    # encode titles in length-bucketed batches, on `model` in this process or across a pool of
+    # `processes` workers that each load the model once. vectors come back in input order
+    titles = list(titles)
+    if not titles:
+        return np.empty((0, 0), dtype=np.float32)
+
+    started = time.monotonic()
+    lengths = np.fromiter((approximate_tokens(title) for title in titles), dtype=np.int64, count=len(titles))
+    order = np.argsort(lengths, kind='stable')
+    batches = [[titles[position] for position in order[start:end]]
+               for start, end in plan_batches(lengths[order], token_budget)]
+
+    # forked workers don't re-run the calling script, which is top-level code in investigate.py and cluster.py.
+    # where fork isn't available (windows), encode in this process instead
+    if processes > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        processes = 1
+
+    if processes > 1:
+        threads = max(1, (os.cpu_count() or processes) // processes)
+        with ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context('fork'), initializer=_load_worker_model,
+            initargs=(model_name, threads),
+        ) as pool:
+            encoded = list(pool.map(_encode_batch, batches))
+    else:
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name)
+        encoded = [model.encode(batch, batch_size=len(batch)) for batch in batches]
+
+    vectors = np.empty((len(titles), encoded[0].shape[1]), dtype=encoded[0].dtype)
+    vectors[order] = np.concatenate(encoded)
+
+    elapsed = time.monotonic() - started
+    print(f'encoded {len(titles)} titles in {len(batches)} batches with {processes} process(es): '
+          f'{len(titles) / max(elapsed, 1e-9):.0f} titles/s')
+
+    return vectors
+
+
+# **************
+# embedding store
+# **************
+
+def title_key(title):
+    # embeddings depend on the exact text, so titles are keyed on a hash of the raw string
+    return hashlib.sha256(title.encode('utf-8')).hexdigest()[:32].encode('ascii')
+
+
+class EmbeddingStore:
+    # sentence-transformer vectors persisted as a .npy memmap, plus a matching array of title keys.
+    # only titles that haven't been seen before are encoded
+    def __init__(self, directory, model_name='all-MiniLM-L6-v2', dtype=np.float32, processes=1, token_budget=8192):
+        self.model_name = model_name
+        self.processes = processes
+        self.token_budget = token_budget
+        self.dtype = np.dtype(dtype)
+        self.directory = os.path.join(directory, f'{model_name.replace("/", "__")}_{self.dtype.name}')
+        self.vectors_path = os.path.join(self.directory, 'vectors.npy')
+        self.keys_path = os.path.join(self.directory, 'keys.npy')
+        self.model = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.keys_path):
+            self.keys = np.load(self.keys_path)
+            # vectors are written before keys, so any rows past the last key are from an interrupted append
+            self.vectors = np.load(self.vectors_path, mmap_mode='r')[:len(self.keys)]
+        else:
+            self.keys = np.empty(0, dtype='S32')
+            self.vectors = None
+
+        self.rows = {key: row for row, key in enumerate(self.keys.tolist())}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def encode(self, titles):
+        if self.processes > 1:
+            return encode_titles(titles, self.model_name, processes=self.processes, token_budget=self.token_budget)
+
+        if self.model is None:
+            # loaded on first use, so fully cached reruns never load the model
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(self.model_name)
+
+        return encode_titles(titles, self.model_name, model=self.model, token_budget=self.token_budget)
+
+    @contextmanager
+    def lock(self):
+        # scripts sharing the store (investigate.py and cluster.py can run side by side) take turns appending.
+        # without fcntl (windows) appends aren't serialized
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+
+        with open(os.path.join(self.directory, '.lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def append(self, keys, vectors):
+        # rewrite the memmap with the new rows added, then swap it in
+        with self.lock():
+            # another process may have appended since this store was loaded, so start from what's on disk
+            # and skip the keys it already added
+            self.load()
+            fresh = [position for position, key in enumerate(keys) if key not in self.rows]
+            if not fresh:
+                return
+
+            keys = [keys[position] for position in fresh]
+            vectors = np.asarray(vectors, dtype=self.dtype)[fresh]
+            existing = len(self.keys)
+
+            tmp_vectors_path = self.temp_path()
+            tmp_keys_path = self.temp_path()
+            try:
+                combined = np.lib.format.open_memmap(
+                    tmp_vectors_path, mode='w+', dtype=self.dtype, shape=(existing + len(keys), vectors.shape[1])
+                )
+                if existing:
+                    combined[:existing] = self.vectors
+                combined[existing:] = vectors
+                combined.flush()
+                del combined
+
+                np.save(tmp_keys_path, np.concatenate([self.keys, np.array(keys, dtype='S32')]))
+
+                self.vectors = None
+                os.replace(tmp_vectors_path, self.vectors_path)
+                os.replace(tmp_keys_path, self.keys_path)
+            finally:
+                for path in (tmp_vectors_path, tmp_keys_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+            self.load()
+
+    def temp_path(self):
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix='.tmp.npy')
+        os.close(fd)
+        return path
+
+    def embed(self, titles):
+        titles = list(titles)
+        keys = [title_key(title) for title in titles]
+
+        # encode each unseen title once
+        new = {}
+        for key, title in zip(keys, titles):
+            if key not in self.rows and key not in new:
+                new[key] = title
+
+        print(f'{len(new)} of {len(set(keys))} distinct titles not in the embedding store')
+        if new:
+            self.append(list(new), self.encode(list(new.values())))
+
+        if not titles:
+            return np.empty((0, 0 if self.vectors is None else self.vectors.shape[1]), dtype=self.dtype)
+
+        rows = np.fromiter((self.rows[key] for key in keys), dtype=np.int64, count=len(keys))
+
+        # titles stored contiguously and in order come back as a zero-copy view of the memmap
+        if rows[-1] - rows[0] == len(rows) - 1 and (np.diff(rows) == 1).all():
+            return self.vectors[rows[0]:rows[-1] + 1]
+
+        return self.vectors[rows]
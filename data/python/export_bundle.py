@@ -0,0 +1,109 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from table_io import read_table
+from search_index import build_search_index
+
+# packs everything the frontend components need into one compact JSON file, instead of each component
+# downloading and parsing the full CSVs. the CSVs stay in static/data for download
+
+bundle_path = '../../static/data/bundle.json'
+
+# title search index, over the same row ids as the bundle
+search_index_path = '../../static/data/search_index.json'
+
+# rows shown in the top three-word phrase list
+top_phrases = 20
+
+
+# **************
+# encoding
+# **************
+
+def dictionary_encode(values):
+    # labels in order of first appearance, and each row's position in them (-1 where missing)
+    codes, labels = pd.factorize(values, use_na_sentinel=True)
+    return codes.tolist(), labels.astype(str).tolist()
+
+
+def split_urls(urls):
+    # urls share a handful of prefixes (e.g. https://www.af.mil/news/photos?igphoto=), so each url is
+    # stored as a prefix index plus the rest of the url
+    urls = pd.Series(urls, dtype=object)
+    known = urls.notna().to_numpy()
+    split = urls[known].str.extract(r'^(.*[=/])([^=/]*)$')
+
+    prefixes = pd.Series(None, index=urls.index, dtype=object)
+    suffixes = pd.Series('', index=urls.index, dtype=object)
+    prefixes[known] = split[0].fillna('')
+    suffixes[known] = split[1].fillna(urls[known])
+
+    prefix_codes, prefix_labels = dictionary_encode(prefixes)
+    return prefix_codes, prefix_labels, suffixes.tolist()
+
+
+def group_counts(values):
+    # [label, count] in order of first appearance, with missing labels counted as "Unknown" like the charts do
+    values = pd.Series(values, dtype=object).replace('', np.nan).fillna('Unknown')
+    counts = values.value_counts(sort=False)
+
+    return [[label, int(count)] for label, count in counts.items()]
+
+
+# **************
+# data read-in
+# **************
+
+all_titles = read_table('../../static/data/cleaned_titles_with_themes_and_types.csv')
+top_three_words = read_table('../../static/data/top_three_words.csv')
+
+# **************
+# bundle
+# **************
+
+theme_codes, themes = dictionary_encode(all_titles['theme'])
+type_codes, types = dictionary_encode(all_titles['type'])
+url_prefix_codes, url_prefixes, url_suffixes = split_urls(all_titles['url'])
+
+bundle = {
+    'total': len(all_titles),
+    'themes': themes,
+    'types': types,
+    'url_prefixes': url_prefixes,
+    'columns': {
+        'title': all_titles['title'].astype(object).where(all_titles['title'].notna(), '').tolist(),
+        'theme': theme_codes,
+        'type': type_codes,
+        'url_prefix': url_prefix_codes,
+        'url_suffix': url_suffixes,
+    },
+    'summaries': {
+        'theme': group_counts(all_titles['theme']),
+        'type': group_counts(all_titles['type']),
+    },
+    'top_three_words': [
+        [words, int(count)] for words, count in zip(top_three_words['words'].head(top_phrases), top_three_words['count'])
+    ],
+}
+
+search_index = build_search_index(all_titles['title'], {'theme': theme_codes, 'type': type_codes})
+
+# **************
+# save
+# **************
+
+def write_json(data, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+write_json(bundle, bundle_path)
+write_json(search_index, search_index_path)
+
+csv_bytes = os.path.getsize('../../static/data/cleaned_titles_with_themes_and_types.csv') + os.path.getsize('../../static/data/top_three_words.csv')
+print(f'wrote {bundle_path}: {os.path.getsize(bundle_path) / 1e6:.2f} MB in place of {csv_bytes / 1e6:.2f} MB of CSVs')
+print(f'wrote {search_index_path}: {len(search_index["tokens"])} tokens, {os.path.getsize(search_index_path) / 1e6:.2f} MB')
@@ -1,67 +1,153 @@
+from itertools import chain
+
+import numpy as np
 import pandas as pd
-import nltk
-from nltk.corpus import stopwords
-from nltk.tag import pos_tag
 
 
-def get_top_words(df):
-    # concatenate all titles without keywords and split into words
-    all_words = (df['title']
-                 # remove special characters
-                 .str.replace(':', '')
-                 # convert to lowercase 
-                .str.lower()                    
-                # concatenate all titles with space separator
-                .str.cat(sep=' ')              
-                # split into list of words
-                .split())                      
+# nltk's english stop words, loaded on first use and shared by every helper
+_stop_words = None
+
+
+def get_stop_words(extra_stop_words=None):
+    global _stop_words
+
+    if _stop_words is None:
+        # imported here so importing helper_functions doesn't pay for nltk
+        from nltk.corpus import stopwords
+        _stop_words = frozenset(stopwords.words('english'))
+
+    # optionally extend with custom stop words, e.g. military boilerplate like 'airmen' or 'base'
+    if extra_stop_words:
+        return _stop_words | frozenset(extra_stop_words)
+
+    return _stop_words
+
+
+# how each n-gram order normalizes a whitespace token, matching the original helpers:
+# single words drop colons and are lowercased, two-word phrases keep tokens as is,
+# three-word phrases drop colons. tokens left empty are removed from that order's stream
+NGRAM_TOKEN_NORMALIZERS = {
+    1: lambda token: token.replace(':', '').lower(),
+    2: lambda token: token,
+    3: lambda token: token.replace(':', ''),
+}
+
+
+def _tokenize_titles(titles):
+    # split every title once into integer codes over a vocabulary of raw tokens
+    words = [title.split() for title in titles]
+    lengths = np.fromiter((len(title_words) for title_words in words), dtype=np.int64, count=len(words))
+    raw_codes, raw_vocab = pd.factorize(pd.Series(list(chain.from_iterable(words)), dtype=object))
+    raw_title_ids = np.repeat(np.arange(len(words)), lengths)
+
+    return raw_codes, raw_vocab, raw_title_ids
+
+
+def _ngram_table(tokens, order, stop_words):
+    raw_codes, raw_vocab, raw_title_ids = tokens
+    normalize = NGRAM_TOKEN_NORMALIZERS.get(order, NGRAM_TOKEN_NORMALIZERS[2])
+
+    # normalize the vocabulary rather than every token, then re-code onto it
+    vocab_map, vocab = pd.factorize(pd.Series([normalize(token) for token in raw_vocab], dtype=object))
+    codes = vocab_map[raw_codes]
+    keep = ~np.isin(codes, np.flatnonzero(vocab == ''))
+    codes = codes[keep]
+    title_ids = raw_title_ids[keep]
+
+    # n-grams start wherever the next order - 1 tokens belong to the same title
+    starts = np.flatnonzero(title_ids[:len(title_ids) - order + 1] == title_ids[order - 1:])
+    gram_codes = np.stack([codes[starts + offset] for offset in range(order)], axis=1)
+
+    # pack each n-gram into one integer key, refactorizing after every step so keys never overflow
+    labels = gram_codes[:, 0]
+    for offset in range(1, order):
+        labels, _ = pd.factorize(labels * len(vocab) + gram_codes[:, offset])
+    labels, _ = pd.factorize(labels)
+
+    # token codes of each unique n-gram, in first-occurrence order
+    _, first = np.unique(labels, return_index=True)
+    unique_codes = gram_codes[first]
+
+    # flag n-grams containing any stop word, checked by token id
+    is_stop_word = np.fromiter((token in stop_words for token in vocab), dtype=bool, count=len(vocab))
+    has_stop_word = is_stop_word[unique_codes].any(axis=1)
+
+    # n-gram label and title of every occurrence, plus what is needed to render and filter labels
+    return labels, title_ids[starts], unique_codes, vocab, has_stop_word
+
+
+def _phrases(grams, unique_codes, vocab):
+    return [' '.join(vocab[code] for code in unique_codes[gram]) for gram in grams]
+
+
+def ngram_counts(df, n=(1, 2, 3), extra_stop_words=None):
+    orders = (n,) if isinstance(n, int) else tuple(n)
+
+    tokens = _tokenize_titles(df['title'].dropna())
+    stop_words = get_stop_words(extra_stop_words)
+
+    counts = {}
+    for order in orders:
+        labels, _, unique_codes, vocab, has_stop_word = _ngram_table(tokens, order, stop_words)
+
+        # totals per n-gram, ranked like value_counts, then stop word n-grams dropped
+        ranked = pd.Series(np.bincount(labels, minlength=len(unique_codes))).sort_values(ascending=False, kind="stable")
+        ranked = ranked[~has_stop_word[ranked.index.to_numpy()]]
 
-    # create Series of word frequencies 
-    word_counts = pd.Series(all_words).value_counts()
+        counts[order] = pd.Series(
+            ranked.to_numpy(),
+            index=_phrases(ranked.index, unique_codes, vocab),
+            name='count',
+        )
 
-    # remove stopwords and verbs
-    stop_words = list(set(stopwords.words('english')))
+    return counts
 
-    word_counts = word_counts[~word_counts.index.isin(stop_words)]
 
-    return word_counts
+def grouped_ngram_counts(df, by='cluster', n=2, top_k=50, extra_stop_words=None):
+    from scipy.sparse import csr_matrix
 
+    rows = df[df['title'].notna()]
+    group_ids, groups = pd.factorize(rows[by])
 
-def get_top_two_words(df):
+    stop_words = get_stop_words(extra_stop_words)
+    labels, title_ids, unique_codes, vocab, has_stop_word = _ngram_table(_tokenize_titles(rows['title']), n, stop_words)
 
-    two_word_phrases = []
+    # keep n-gram occurrences in titles with a group and without stop words
+    gram_groups = group_ids[title_ids]
+    keep = (gram_groups >= 0) & ~has_stop_word[labels]
+    labels = labels[keep]
+    gram_groups = gram_groups[keep]
 
-    for title in df['title']:
-        words = title.split()
-        phrases = [' '.join(pair) for pair in zip(words, words[1:])]
-        two_word_phrases.extend(phrases)
+    # sparse group x n-gram count matrix, with each cell's first occurrence kept alongside for tie breaking
+    num_grams = max(len(unique_codes), 1)
+    cells, first, totals = np.unique(gram_groups * num_grams + labels, return_index=True, return_counts=True)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(cells // num_grams, minlength=len(groups)))])
+    matrix = csr_matrix((totals, cells % num_grams, indptr), shape=(len(groups), num_grams))
 
-    two_word_counts = pd.Series(two_word_phrases).value_counts()
+    # top k n-grams of each group, ranked like get_top_two_words on that group's titles
+    counts = {}
+    for group_id, group in enumerate(groups):
+        row = slice(matrix.indptr[group_id], matrix.indptr[group_id + 1])
+        ranked = np.lexsort((first[row], -matrix.data[row]))[:top_k]
+        counts[group] = pd.Series(
+            matrix.data[row][ranked],
+            index=_phrases(matrix.indices[row][ranked], unique_codes, vocab),
+            name='count',
+        )
 
-    # filter out cases where both words are stop words
-    stop_words = list(set(stopwords.words('english')))
-    
-    two_word_counts = two_word_counts[(~two_word_counts.index.str.split(' ').str[0].isin(stop_words)) & (~two_word_counts.index.str.split(' ').str[1].isin(stop_words))]
-    
-    
-    # Return only phrases without verbs
-    return two_word_counts
+    return counts
 
 
-def get_top_three_words(df):
-    three_word_phrases = []
+def get_top_words(df, extra_stop_words=None):
+    # single words, lowercased and without colons, minus stop words
+    return ngram_counts(df, n=1, extra_stop_words=extra_stop_words)[1]
 
-    for title in df['title']:
-        title = title.replace(':', '')
-        words = title.split()
-        phrases = [' '.join(pair) for pair in zip(words, words[1:], words[2:])]
-        three_word_phrases.extend(phrases)
 
-    three_word_counts = pd.Series(three_word_phrases).value_counts()
+def get_top_two_words(df, extra_stop_words=None):
+    # two-word phrases where neither word is a stop word
+    return ngram_counts(df, n=2, extra_stop_words=extra_stop_words)[2]
 
-    # filter out cases where both words are stop words
-    stop_words = list(set(stopwords.words('english')))
-    three_word_counts = three_word_counts[(~three_word_counts.index.str.split(' ').str[0].isin(stop_words)) & (~three_word_counts.index.str.split(' ').str[1].isin(stop_words)) & (~three_word_counts.index.str.split(' ').str[2].isin(stop_words))]
 
-    return three_word_counts
-    
\ No newline at end of file
+def get_top_three_words(df, extra_stop_words=None):
+    # three-word phrases (colons removed) where no word is a stop word
+    return ngram_counts(df, n=3, extra_stop_words=extra_stop_words)[3]
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import tempfile
+
+import pandas as pd
+
+# every script reads photos through here. the raw JSON is parsed and cleaned once, and the result is
+# cached as parquet next to the hash of the raw file it came from, so scripts only re-parse after a new scrape
+RAW_PATH = '../raw/photos.json'
+CACHE_PATH = '../processed/photos.parquet'
+
+# bump when clean_photos changes, so existing caches are rebuilt
+CLEANING_VERSION = '1'
+
+
+# **************
+# parsing
+# **************
+
+def iter_records(path=RAW_PATH):
+    # (filename, title, url) for each row of the export, parsed incrementally instead of loading the
+    # whole document into python objects
+    import ijson
+
+    with open(path, 'rb') as f:
+        for filename, title, url in ijson.items(f, 'rows.item.columns'):
+            yield filename, title, url
+
+
+def iter_record_chunks(path=RAW_PATH, chunk_size=50000):
+    # the records as dataframes of at most chunk_size rows, so memory stays flat however big the export is
+    chunk = []
+    for record in iter_records(path):
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield pd.DataFrame(chunk, columns=['filename', 'title', 'url'])
+            chunk = []
+
+    if chunk:
+        yield pd.DataFrame(chunk, columns=['filename', 'title', 'url'])
+
+
+# **************
+# cleaning
+# **************
+
+def clean_photos(df):
+    # the one cleaning pass every script shares
+    df = df.copy()
+
+    # clean up the URLs by removing the markdown formatting
+    df['url'] = df['url'].str.extract(r'\[(.*?)\]')[0]
+
+    # clean up titles by standardizing apostrophes
+    df['title'] = df['title'].str.replace("’", "'")
+
+    # titles that are one word long and contain numbers are photo ids (e.g. 160518-M-GB581-006), not
+    # descriptions. this also covers the numeric_title patterns investigate.py used to match
+    df['one_word_with_numbers'] = (
+        df['title'].str.match(r'^\S*\d+\S*$') & ~df['title'].str.contains(r'\s')
+    ).fillna(False).astype(bool)
+
+    for column in ['filename', 'title', 'url']:
+        df[column] = df[column].astype('string')
+
+    return df
+
+
+def keep_clean_titles(df):
+    # drop photo-id titles and photos without a title
+    return df[~df['one_word_with_numbers'] & df['title'].notna()]
+
+
+# **************
+# cache
+# **************
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def cache_fingerprint(raw_path):
+    return f'{file_hash(raw_path)}:{CLEANING_VERSION}'
+
+
+def read_cache_fingerprint(cache_path):
+    import pyarrow.parquet as pq
+
+    if not os.path.exists(cache_path):
+        return None
+
+    metadata = pq.read_schema(cache_path).metadata or {}
+    return metadata.get(b'raw_fingerprint', b'').decode('utf-8') or None
+
+
+def photo_schema(fingerprint):
+    import pyarrow as pa
+
+    return pa.schema([
+        ('filename', pa.string()),
+        ('title', pa.string()),
+        ('url', pa.string()),
+        ('one_word_with_numbers', pa.bool_()),
+    ], metadata={b'raw_fingerprint': fingerprint.encode('utf-8')})
+
+
+def build_cache(raw_path, cache_path, fingerprint, chunk_size=50000):
+    # clean the export chunk by chunk, appending each chunk to the parquet file as it's parsed
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    schema = photo_schema(fingerprint)
+    rows = 0
+
+    # write next to the cache and swap it in, so a crash never leaves a half-written cache behind. the temp
+    # name is unique, so scripts rebuilding the cache at the same time never write into each other's file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path) or '.', suffix='.parquet.tmp')
+    os.close(fd)
+    try:
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            for chunk in iter_record_chunks(raw_path, chunk_size):
+                writer.write_table(pa.Table.from_pandas(clean_photos(chunk), schema=schema, preserve_index=False))
+                rows += len(chunk)
+
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    print(f'cached {rows} cleaned photos to {cache_path}')
+
+
+def load_photos(raw_path=RAW_PATH, cache_path=CACHE_PATH, clean=True, chunk_size=50000):
+    # every photo with the canonical cleaning applied, rebuilding the cache if the raw file changed.
+    # with clean=True, photo-id and missing titles are dropped
+    fingerprint = cache_fingerprint(raw_path)
+
+    if read_cache_fingerprint(cache_path) != fingerprint:
+        build_cache(raw_path, cache_path, fingerprint, chunk_size)
+
+    df = pd.read_parquet(cache_path)
+    return keep_clean_titles(df) if clean else df
+
+
+if __name__ == '__main__':
+    # the pipeline's ingest stage: build the cache once, before the stages that read it start side by side
+    photos = load_photos(clean=False)
+    print(f'{len(photos)} photos in {CACHE_PATH}')
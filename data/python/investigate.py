@@ -1,31 +1,24 @@
-import pandas as pd
-from helper_functions import get_top_words, get_top_two_words, get_top_three_words
-from sentence_transformers import SentenceTransformer
-from sklearn.cluster import KMeans
+import os
+import numpy as np
+from helper_functions import get_top_words, get_top_two_words, ngram_counts, grouped_ngram_counts
+from embedding_store import EmbeddingStore
+from clustering import sweep_k, pick_k, fit_clusters, save_centroids, load_centroids, assign_clusters
+from near_duplicates import near_duplicate_groups
+from keyword_matcher import build_keyword_matcher, keyword_matrix, summarize_keywords, keyword_cooccurrence, uncovered_titles
+from ingest import load_photos
+from table_io import write_table
 
 # **************
 # data read-in
 # **************
 
-# read the JSON file
-df = pd.read_json('../raw/photos.json')
+# the shared cleaning: no photo-id titles (e.g. 160518-M-GB581-006) and no missing titles
+clean_df = load_photos()
 
 # **************
 # data cleaning
 # **************
 
-# convert the 'columns' arrays into separate columns
-df = pd.DataFrame(df['rows'].tolist())
-df = pd.DataFrame(df['columns'].tolist(), columns=['filename', 'title', 'url'])
-
-# clean up the URLs by removing the markdown formatting
-df['url'] = df['url'].str.extract(r'\[(.*?)\]')[0]
-
-# mark and remove numeric titles
-df['numeric_title'] = df['title'].str.match(r'^\d{6}-[A-Z]-[A-Z0-9]+-\d+$') | df['title'].str.match(r'^\d{6}-[a-z]-[a-z0-9]+-\d+(\.[a-z]+)?$')
-
-clean_df = df[~df['numeric_title']]
-
 # remove duplicate titles
 clean_df_no_duplicates = clean_df.drop_duplicates(subset=['title'])
 
@@ -35,30 +28,70 @@ print(clean_df.shape[0])
 # cluster titles
 # **************
 
-# Load the pre-trained sentence transformer model
-model = SentenceTransformer('all-MiniLM-L6-v2')
-
-# Convert titles to embeddings
-embeddings = model.encode(clean_df_no_duplicates.title.tolist())
-
-# Perform clustering using KMeans
-kmeans = KMeans(n_clusters=10, random_state=42)
-kmeans.fit(embeddings)
+# number of clusters, or None to pick it with a k sweep
+n_clusters = 10
+candidate_ks = range(4, 21)
+
+# 'kmeans' for full-batch KMeans, 'minibatch' for MiniBatchKMeans on large title sets
+clustering_backend = 'kmeans'
+
+# fitted centroids are saved here, and new titles are assigned to them unless refit_clusters is set
+centroids_path = '../processed/cluster_centroids.npy'
+refit_clusters = True
+
+# embed and cluster one representative per group of near-duplicate titles, and put the rest of each
+# group in its representative's cluster
+collapse_near_duplicates = True
+near_duplicate_threshold = 0.8
+
+if collapse_near_duplicates:
+    near_duplicates = near_duplicate_groups(clean_df_no_duplicates['title'], near_duplicate_threshold)
+    representative_positions = np.unique(near_duplicates['representative'].to_numpy())
+else:
+    representative_positions = np.arange(len(clean_df_no_duplicates))
+
+# Convert titles to embeddings, only encoding titles the store hasn't seen before
+embedding_store = EmbeddingStore('../processed/embeddings', model_name='all-MiniLM-L6-v2')
+embeddings = embedding_store.embed(clean_df_no_duplicates['title'].iloc[representative_positions].tolist())
+
+if os.path.exists(centroids_path) and not refit_clusters:
+    # assign titles to the saved clusters without refitting
+    cluster_labels = assign_clusters(embeddings, load_centroids(centroids_path))
+else:
+    if n_clusters is None:
+        # pick k by silhouette, sweeping candidates in parallel on a sample of the titles
+        k_scores = sweep_k(embeddings, ks=candidate_ks, backend=clustering_backend)
+        print(k_scores)
+        n_clusters = pick_k(k_scores)
+        print(f'picked {n_clusters} clusters')
+
+    clusterer = fit_clusters(embeddings, n_clusters, backend=clustering_backend)
+    save_centroids(clusterer, centroids_path)
+    cluster_labels = clusterer.labels_
+
+if collapse_near_duplicates:
+    # members take the cluster of their representative
+    representative_clusters = np.empty(len(clean_df_no_duplicates), dtype=np.int64)
+    representative_clusters[representative_positions] = cluster_labels
+    cluster_labels = representative_clusters[near_duplicates['representative'].to_numpy()]
 
 # Add cluster labels to the DataFrame
-clean_df_no_duplicates['cluster'] = kmeans.labels_
+clean_df_no_duplicates['cluster'] = cluster_labels
 
 # **************
 # top words
 # **************
 
-word_counts = get_top_words(clean_df)
+# count one, two and three word phrases from one tokenization of the titles
+phrase_counts = ngram_counts(clean_df, n=(1, 2, 3))
+
+word_counts = phrase_counts[1]
 print(word_counts.head(50))
 
-two_word_counts = get_top_two_words(clean_df)
+two_word_counts = phrase_counts[2]
 print(two_word_counts.head(50))
 
-three_word_counts = get_top_three_words(clean_df)
+three_word_counts = phrase_counts[3]
 print(three_word_counts.head(50))
 
 # **************
@@ -166,32 +199,34 @@ keywords = [
     'contraceptive',
     ]
 
+# scan every title once into a sparse title x keyword matrix
+keyword_matcher = build_keyword_matcher({'keywords': keywords})
+keyword_hits = keyword_matrix(clean_df['title'], keyword_matcher)
+
 # create a column that checks if any keyword is present
-clean_df['has_keywords'] = clean_df['title'].str.lower().apply(
-    lambda x: any(keyword in x for keyword in keywords)
-)
+clean_df['has_keywords'] = ~uncovered_titles(keyword_hits, keyword_matcher)
 
 # create a column that lists all present keywords
-clean_df['keywords_present'] = clean_df['title'].str.lower().apply(
-    lambda x: ', '.join([keyword for keyword in keywords if keyword in x])
-)
+clean_df['keywords_present'] = [
+    ', '.join(keyword_matcher['columns'][position] for position in keyword_hits.indices[start:end])
+    for start, end in zip(keyword_hits.indptr[:-1], keyword_hits.indptr[1:])
+]
 
 clean_df = clean_df.merge(clean_df_no_duplicates[['title', 'cluster']], on='title', how='left')
 
-# top keywords by cluster
-for cluster in clean_df.cluster.unique():
+# top keywords by cluster, counted for every cluster in one pass over the titles
+for cluster, cluster_two_word_counts in grouped_ngram_counts(clean_df, by='cluster', n=2, top_k=50).items():
     print(cluster)
-    print(get_top_two_words(clean_df[clean_df.cluster == cluster]).head(50))
+    print(cluster_two_word_counts)
     print('\n')
 
 print(get_top_two_words(clean_df[clean_df.keywords_present.str.contains('native')]).head(50))
 
 # count the number of photos with each keyword, and the percentage of photos with each keyword
-keyword_summary = pd.DataFrame(columns=['keyword', 'photos', 'percentage'])
-for keyword in keywords:
-    keyword_summary = pd.concat([keyword_summary, pd.DataFrame({'keyword': [keyword], 'photos': [clean_df[clean_df['keywords_present'].str.contains(keyword)].shape[0]], 'percentage': [clean_df[clean_df['keywords_present'].str.contains(keyword)].shape[0] / clean_df.shape[0]]})])
+keyword_summary = summarize_keywords(keyword_hits, keyword_matcher)
 
-keyword_summary = keyword_summary.sort_values(by='percentage', ascending=False)
+# keywords that show up in the same titles
+print(keyword_cooccurrence(keyword_hits, keyword_matcher).head(20))
 
 print(clean_df[clean_df.has_keywords].shape[0] / clean_df.shape[0]) 
 
@@ -206,5 +241,5 @@ print(word_counts_left.iloc[50:100])
 # save the cleaned data
 # **************
 
-clean_df[~clean_df.has_keywords].to_csv('../processed/remaining_photos.csv', index=False)
+write_table(clean_df[~clean_df.has_keywords], '../processed/remaining_photos.csv')
 
@@ -0,0 +1,150 @@
+# **************
+# keyword groups
+# **************
+
+# it seems like there are a few large clusters that should be split into separate keyword groups
+# 1. black (includes things like MLK, tuskegee, soul food, etc.)
+# 2. women
+# 3. hispanic
+# 4. native american/indian (includes powwow, lumbee, code talker, etc.)
+# 5. asian
+# 6. lgbtq+ / pride (includes gay false pickups)
+# 7. various other diversity keywords
+
+KEYWORD_GROUPS = {
+    'women': [
+        'women', 
+        'woman',
+        "women's history month",
+        "women's history",
+        'female',
+        'celebrating women',
+        'honor women',
+        'whm',
+        'her shoes',
+        'contraceptive', 
+        'contraception', 
+        'honoring sixtripleeight',
+        'wasp', #women airforce service pilots
+        'wps', #women, peace, and security
+    ],
+    'black': [
+        'black',
+        'black history month', 
+        'african american',
+        'african-american',
+        'african american heritage',
+        'african american history',
+        'african american history month',
+        'juneteenth',
+        'tuskegee',
+        'martin luther king',
+        'martin luthor king',
+        'mlk',
+        'aahm',
+        'aahc',
+        'bhm',
+        'gospel',
+        'soul food', 
+        'slave',
+        'vance marchbanks',
+        'elayne arrington',
+    ],
+    'hispanic': [
+        'hispanic heritage month',
+        'hispanic',
+        'latin',
+        'unidos',
+        'latinx',
+        'hahm',
+        'latin american',
+        'buen provecho',
+        'fiesta'
+    ],
+     'asian/pacific islander': [
+        'asian',
+        'asian american',
+        'asian american heritage',
+        'asian american heritage month',
+        'pacific island',
+        'luau',
+        'aloha',
+        'haka',
+        'aapi',
+        'apahm', #asian pacific american heritage month
+        'aanhpi', #asian american native hawaiian/pacific islander month
+    ],
+    'native american': [
+        'native',
+        'indian',
+        'powwow',
+        'lumbee',
+        'indigenous',
+        'code talker',
+        'navajo', 
+        'cherokee',
+        'nahm', #native american heritage month
+        'naih', #native american and indigenous heritage 
+        'naihm', #native american and indigenous heritage month
+        'filipino',
+    ],
+    'lgbtq+': [
+        'lgbt',
+        'lgbtq',
+        'pride',
+        'gay',
+        'gender', 
+        'rainbow',
+    ],
+    'other ethnicities & religions': [
+        'jewish american heritage',
+        'holocaust',
+        'irish american heritage',
+        'german american heritage',
+        'eid',
+        'french american heritage',
+        'italian american heritage',
+        'observance graphic',
+    ],
+    'diversity': [
+        'heritage',
+        'diversity',
+        'dei',
+        'deia',
+        'unconscious bias',
+        'equal employment',
+        'inclusive',
+        'inclusion',
+        'inclusivity',
+        'sexual assault prevention',
+        'barrier',
+        'breaking barriers',
+        'multicultural', 
+        'multi-cultural',
+        'culture',
+        'cultural',
+        'cultural awareness',
+        'immigrant',
+        'refugee',
+        'disability',
+        'disabilities',
+        'prosthetic',
+        'included',
+        'inspiring change', 
+        'remembers past', 
+        'mentoring moment', 
+        'out of the shadows',
+        'celebrating culture',
+        'celebrating diversity',
+        'celebrating history',
+        'celebrating heritage',
+        'spreading awareness',
+        'first',
+        'remembrance',
+        'next generation',
+    ],
+    'no clear theme': [
+        '', # catch call
+        'medical care',
+    ],
+}
@@ -0,0 +1,262 @@
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+# **************
+# matcher
+# **************
+
+def build_keyword_matcher(keyword_groups):
+    # every distinct non-empty keyword across all groups, in first-seen order
+    keywords = list(dict.fromkeys(
+        keyword for group_keywords in keyword_groups.values() for keyword in group_keywords if keyword
+    ))
+
+    # one combined regex, longest keywords first, so each offset reports its longest hit.
+    # the lookahead lets overlapping keywords (e.g. 'women' inside "women's history") all match
+    ordered = sorted(keywords, key=len, reverse=True)
+    pattern = re.compile('(?=(' + '|'.join(re.escape(keyword) for keyword in ordered) + '))')
+
+    # shorter keywords that are a prefix of the longest hit also hit at that same offset
+    prefixes = {keyword: [other for other in keywords if keyword.startswith(other)] for keyword in keywords}
+
+    # the '' catch all keyword is present in every title
+    catch_all = any('' in group_keywords for group_keywords in keyword_groups.values())
+
+    # columns of the title x keyword matrix: every distinct keyword, the catch all included
+    columns = list(dict.fromkeys(keyword for group_keywords in keyword_groups.values() for keyword in group_keywords))
+
+    # positions (in keyword_groups order) of the groups listing each keyword
+    owners = {}
+    for position, group_keywords in enumerate(keyword_groups.values()):
+        for keyword in group_keywords:
+            owners.setdefault(keyword, [])
+            if position not in owners[keyword]:
+                owners[keyword].append(position)
+
+    return {
+        'keyword_groups': keyword_groups,
+        'group_names': list(keyword_groups),
+        'pattern': pattern,
+        'prefixes': prefixes,
+        'catch_all': catch_all,
+        'owners': owners,
+        'columns': columns,
+        'column_positions': {keyword: position for position, keyword in enumerate(columns)},
+    }
+
+
+def scan_title(title, matcher):
+    # returns (keyword, offset) for every keyword occurrence in a single scan of the title
+    title = title.lower() if isinstance(title, str) else ''
+
+    hits = [('', 0)] if matcher['catch_all'] else []
+    for match in matcher['pattern'].finditer(title):
+        offset = match.start()
+        hits.extend((keyword, offset) for keyword in matcher['prefixes'][match.group(1)])
+
+    return hits
+
+
+# **************
+# tagging
+# **************
+
+def match_keywords(titles, matcher):
+    # long table of every hit: title row position, keyword group, keyword and character offset
+    group_names = matcher['group_names']
+
+    rows = []
+    for row, title in enumerate(titles):
+        for keyword, offset in scan_title(title, matcher):
+            for position in matcher['owners'][keyword]:
+                rows.append((row, group_names[position], keyword, offset))
+
+    return pd.DataFrame(rows, columns=['row', 'keyword_group', 'keyword', 'offset'])
+
+
+def keyword_matrix(titles, matcher):
+    # sparse boolean titles x keywords matrix (columns in matcher['columns'] order), from one scan per title
+    from scipy.sparse import csr_matrix
+
+    column_positions = matcher['column_positions']
+
+    indices = []
+    indptr = [0]
+    for title in titles:
+        indices.extend(sorted({column_positions[keyword] for keyword, _ in scan_title(title, matcher)}))
+        indptr.append(len(indices))
+
+    return csr_matrix(
+        (np.ones(len(indices), dtype=bool), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(indptr) - 1, len(matcher['columns'])),
+    )
+
+
+def tag_titles(titles, matcher):
+    # keyword group columns for each title, the number of titles containing each keyword, and the
+    # title x keyword matrix they were both derived from
+    matrix = keyword_matrix(titles, matcher)
+    tags = matrix_tags(matrix, matcher, index=titles.index if isinstance(titles, pd.Series) else None)
+
+    return tags, keyword_counts(matrix, matcher), matrix
+
+
+def matrix_tags(matrix, matcher, index=None):
+    # keyword groups present, the top keyword group and its keywords, for each row of the matrix
+    keyword_groups = matcher['keyword_groups']
+    group_names = matcher['group_names']
+    columns = matcher['columns']
+
+    groups_present = []
+    top_groups = []
+    top_group_keywords = []
+
+    for row in range(matrix.shape[0]):
+        found = {columns[position] for position in matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]}
+
+        # groups in keyword_groups order, so the first one is the top keyword group
+        positions = {position for keyword in found for position in matcher['owners'][keyword]}
+        present = [group_names[position] for position in sorted(positions)]
+        top_group = present[0] if present else ''
+
+        groups_present.append(', '.join(present))
+        top_groups.append(top_group)
+        top_group_keywords.append(', '.join(
+            keyword for keyword in keyword_groups.get(top_group, []) if keyword in found
+        ))
+
+    return pd.DataFrame({
+        'keyword_groups_present': groups_present,
+        'top_keyword_group': top_groups,
+        'top_keyword_group_keywords': top_group_keywords,
+    }, index=index)
+
+
+# **************
+# matrix reductions
+# **************
+
+def keyword_counts(matrix, matcher):
+    # number of titles containing each keyword, listed per keyword group
+    title_counts = dict(zip(matcher['columns'], keyword_title_counts(matrix).tolist()))
+
+    return pd.DataFrame([
+        {'keyword_group': keyword_group, 'keyword': keyword, 'count': title_counts[keyword]}
+        for keyword_group, group_keywords in matcher['keyword_groups'].items()
+        for keyword in group_keywords
+    ], columns=['keyword_group', 'keyword', 'count'])
+
+
+def keyword_title_counts(matrix):
+    return np.asarray(matrix.sum(axis=0)).ravel().astype(np.int64)
+
+
+def summarize_keywords(matrix, matcher):
+    # titles containing each keyword and their share of all titles, most common first
+    photos = keyword_title_counts(matrix)
+    summary = pd.DataFrame({
+        'keyword': matcher['columns'],
+        'photos': photos,
+        'percentage': photos / max(matrix.shape[0], 1),
+    })
+
+    return summary.sort_values(by='percentage', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def group_matrix(matrix, matcher):
+    # titles x keyword groups: whether any of the group's keywords is in the title
+    from scipy.sparse import csr_matrix
+
+    rows, cols = zip(*[
+        (matcher['column_positions'][keyword], position)
+        for keyword, positions in matcher['owners'].items()
+        for position in positions
+    ]) if matcher['owners'] else ((), ())
+    membership = csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(len(matcher['columns']), len(matcher['group_names'])),
+    )
+
+    return (matrix.astype(np.int32) @ membership) > 0
+
+
+def group_overlaps(matrix, matcher):
+    # titles containing keywords from both groups, with each group's own title count on the diagonal
+    groups = group_matrix(matrix, matcher).astype(np.int32)
+    return pd.DataFrame((groups.T @ groups).toarray(), index=matcher['group_names'], columns=matcher['group_names'])
+
+
+def keyword_cooccurrence(matrix, matcher, min_count=1):
+    # pairs of different keywords found in the same titles, most frequent first
+    from scipy.sparse import triu
+
+    counts = triu(matrix.astype(np.int32).T @ matrix.astype(np.int32), k=1).tocoo()
+    columns = matcher['columns']
+
+    pairs = pd.DataFrame({
+        'keyword': [columns[position] for position in counts.row],
+        'other_keyword': [columns[position] for position in counts.col],
+        'titles': counts.data,
+    })
+
+    # the '' catch all is in every title, so it would pair with everything
+    pairs = pairs[(pairs['keyword'] != '') & (pairs['other_keyword'] != '') & (pairs['titles'] >= min_count)]
+
+    return pairs.sort_values('titles', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def uncovered_titles(matrix, matcher):
+    # titles that contain none of the keywords, not counting the '' catch all
+    keywords = np.array([keyword != '' for keyword in matcher['columns']])
+    return np.asarray(matrix[:, np.flatnonzero(keywords)].sum(axis=1)).ravel() == 0
+
+
+# **************
+# sharded tagging
+# **************
+
+_worker_matcher = None
+
+
+def _build_worker_matcher(keyword_groups):
+    global _worker_matcher
+
+    # each worker compiles the matcher once and reuses it for every shard it tags
+    _worker_matcher = build_keyword_matcher(keyword_groups)
+
+
+def _tag_shard(titles):
+    # keyword counts are summed from the stacked matrix afterwards, so shards only send tags and matrix rows
+    matrix = keyword_matrix(titles, _worker_matcher)
+    return matrix_tags(matrix, _worker_matcher, index=titles.index), matrix
+
+
+def tag_titles_sharded(titles, matcher, processes=1, shards_per_process=4):
+    # tag_titles split over contiguous shards of the titles in a pool of processes. shards come back
+    # in order, so the result is the same as tagging in one process
+    titles = pd.Series(titles)
+    if processes <= 1 or len(titles) < processes:
+        return tag_titles(titles, matcher)
+
+    shard_size = -(-len(titles) // (processes * shards_per_process))
+    shards = [titles.iloc[start:start + shard_size] for start in range(0, len(titles), shard_size)]
+
+    # forked workers don't re-run the calling script, which is top-level code in keyword_analysis.py
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    with ProcessPoolExecutor(
+        processes, mp_context=context, initializer=_build_worker_matcher, initargs=(matcher['keyword_groups'],)
+    ) as pool:
+        results = list(pool.map(_tag_shard, shards))
+
+    from scipy.sparse import vstack
+
+    # shards share the matcher's columns, so their matrices stack into the full title x keyword matrix
+    tags = pd.concat([shard_tags for shard_tags, _ in results])
+    matrix = vstack([shard_matrix for _, shard_matrix in results], format='csr')
+
+    return tags, keyword_counts(matrix, matcher), matrix
@@ -0,0 +1,126 @@
+import hashlib
+import sqlite3
+import time
+import unicodedata
+
+
+# **************
+# keys
+# **************
+
+def normalize_title(title):
+    # titles that only differ by unicode form, curly apostrophes, spacing or case share a cache entry
+    title = unicodedata.normalize('NFKC', title).replace('’', "'")
+    return ' '.join(title.split()).casefold()
+
+
+def cache_key(title, prompt, model):
+    # content address of one classification: the normalized title, the exact prompt text and the model
+    digest = hashlib.sha256()
+    for part in (normalize_title(title), prompt, model):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+
+    return digest.hexdigest()
+
+
+# **************
+# cache
+# **************
+
+class LabelCache:
+    # durable sqlite store of LLM labels, keyed by cache_key
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # fsync the log on every commit, so a label is on disk before the next request is sent and a
+        # crash or power cut loses at most the replies still in flight
+        self.connection.execute('PRAGMA synchronous=FULL')
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS labels (
+                key TEXT PRIMARY KEY,
+                title TEXT,
+                model TEXT,
+                label TEXT,
+                created REAL
+            )
+        """)
+        self.connection.commit()
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(set(keys))
+        # sqlite caps the number of bound parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.connection.execute(
+                f'SELECT key, label FROM labels WHERE key IN ({", ".join("?" * len(chunk))})', chunk
+            )
+            found.update(rows)
+
+        return found
+
+    def put(self, key, title, model, label):
+        self.put_many([(key, title, model, label)])
+
+    def put_many(self, entries):
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO labels (key, title, model, label, created) VALUES (?, ?, ?, ?, ?)',
+            [(key, title, model, label, time.time()) for key, title, model, label in entries],
+        )
+        self.connection.commit()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM labels').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+def cached_labels(titles, cache, prompt, model):
+    # labels already cached for this prompt and model, None where there are none
+    keys = [cache_key(title, prompt, model) for title in titles]
+    labels = cache.get_many(keys)
+
+    return [labels.get(key) for key in keys]
+
+
+def classify_with_cache(titles, classify, cache, prompt, model):
+    # only titles without a cached label for this exact prompt and model are sent to `classify`,
+    # which must accept (titles, on_label) and call on_label(position, label) as each label arrives.
+    # with classify=None, nothing is sent and titles without a cached label come back as None
+    titles = list(titles)
+    keys = [cache_key(title, prompt, model) for title in titles]
+    labels = cache.get_many(keys)
+
+    # classify each missing key once, even if several titles normalize to it
+    todo = []
+    queued = set()
+    for position, key in enumerate(keys):
+        if key not in labels and key not in queued:
+            queued.add(key)
+            todo.append(position)
+
+    print(f'{len(todo)} of {len(titles)} titles not in the label cache')
+
+    if todo and classify is not None:
+        todo_titles = [titles[position] for position in todo]
+        saved = 0
+
+        def store(index, label):
+            nonlocal saved
+
+            # write through as soon as each label arrives so an interrupted run keeps what it paid for
+            if label is not None:
+                cache.put(keys[todo[index]], todo_titles[index], model, label)
+                labels[keys[todo[index]]] = label
+                saved += 1
+
+        try:
+            classify(todo_titles, on_label=store)
+        except KeyboardInterrupt:
+            # every label saved so far is committed, so a rerun picks up with the titles still missing
+            print(f'interrupted: {saved} of {len(todo)} new labels saved to the cache, rerun to resume')
+            raise
+
+    return [labels.get(key) for key in keys]
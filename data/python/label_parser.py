@@ -0,0 +1,73 @@
+import difflib
+import re
+
+import pandas as pd
+
+# **************
+# label parsing
+# **************
+
+# markdown emphasis and quotes the model sometimes wraps its answer in, and a leading "4." / "4)"
+# category number
+DECORATION_PATTERN = re.compile(r'[*"`]')
+NUMBER_PATTERN = re.compile(r'^\s*(\d+)\s*[.)]?\s*')
+
+
+def normalize_response(response):
+    text = DECORATION_PATTERN.sub('', str(response))
+    text = NUMBER_PATTERN.sub('', text)
+    return ' '.join(text.split()).rstrip('.').casefold()
+
+
+def build_label_parser(labels, aliases=None, cutoff=0.85):
+    # labels are the categories in the order the prompt numbers them, so a bare category number like "4"
+    # maps to labels[3]. aliases map other spellings (e.g. labels from older prompts) to a label
+    lookup = {normalize_response(label): position for position, label in enumerate(labels)}
+    for alias, label in (aliases or {}).items():
+        lookup[normalize_response(alias)] = labels.index(label)
+
+    return {
+        'labels': list(labels),
+        'lookup': lookup,
+        'keys': list(lookup),
+        'cutoff': cutoff,
+    }
+
+
+def parse_label(response, parser):
+    # the response's label position: an exact match after normalizing, then a bare category number,
+    # then the closest known spelling. -1 if nothing is close enough
+    if pd.isna(response):
+        return -1
+
+    key = normalize_response(response)
+    if key in parser['lookup']:
+        return parser['lookup'][key]
+
+    number = re.fullmatch(r'\s*[*"`]*\s*(\d+)\s*[.)]?[*"`]*\s*', str(response))
+    if number and 1 <= int(number.group(1)) <= len(parser['labels']):
+        return int(number.group(1)) - 1
+
+    closest = difflib.get_close_matches(key, parser['keys'], n=1, cutoff=parser['cutoff'])
+    return parser['lookup'][closest[0]] if closest else -1
+
+
+def parse_labels(responses, parser, display_names=None, name='label'):
+    # a categorical of the labels (renamed through display_names), parsing each distinct response once.
+    # responses that match no label become missing and are counted as rejects
+    responses = pd.Series(responses)
+    codes, uniques = pd.factorize(responses, use_na_sentinel=True)
+    positions = pd.Series([parse_label(response, parser) for response in uniques], dtype='int64')
+
+    label_codes = positions.to_numpy()[codes] if len(uniques) else codes
+    label_codes[codes == -1] = -1
+
+    categories = [(display_names or {}).get(label, label) for label in parser['labels']]
+    labels = pd.Series(pd.Categorical.from_codes(label_codes, categories=categories), index=responses.index)
+
+    rejected = uniques[(positions == -1).to_numpy()]
+    rejects = int(responses.isin(rejected).sum())
+    if rejects:
+        print(f'{name}: {rejects} responses matched no label: {list(rejected[:10])}')
+
+    return labels, rejects
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+# one JSON line per chat completion call, written as calls finish, plus a summary of latency, tokens
+# and estimated cost per stage:
+#   python llm_metrics.py                    # the latest run in the default metrics file
+#   python llm_metrics.py --all path/to/llm_calls.jsonl
+
+METRICS_PATH = '../processed/llm_calls.jsonl'
+
+# USD per million (prompt, completion) tokens
+PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+}
+
+
+# **************
+# recording
+# **************
+
+class MetricsLog:
+    # appends call records to a JSONL file. every record carries the id of the run that wrote it
+    def __init__(self, path=METRICS_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.run = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def record(self, **fields):
+        self.file.write(json.dumps({'run': self.run, **fields}) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class InstrumentedCompletions:
+    # stands in for client.chat.completions, timing each create() call and logging its outcome
+    def __init__(self, completions, log, stage):
+        self.completions = completions
+        self.log = log
+        self.stage = stage
+
+    async def create(self, **kwargs):
+        started = time.monotonic()
+        status = 'ok'
+        usage = None
+        try:
+            response = await self.completions.create(**kwargs)
+            usage = response.usage
+            return response
+        except Exception as error:
+            # HTTP errors by status code (429 is rate limiting), anything else by exception name
+            status = str(getattr(error, 'status_code', None) or type(error).__name__)
+            raise
+        finally:
+            self.log.record(
+                time=time.time(),
+                stage=self.stage,
+                model=kwargs.get('model'),
+                status=status,
+                latency=time.monotonic() - started,
+                prompt_tokens=getattr(usage, 'prompt_tokens', None),
+                completion_tokens=getattr(usage, 'completion_tokens', None),
+            )
+
+
+def instrument_client(client, log, stage=None):
+    client.chat.completions = InstrumentedCompletions(client.chat.completions, log, stage)
+    return client
+
+
+# **************
+# summary
+# **************
+
+def load_metrics(path=METRICS_PATH, run=None):
+    # every recorded call, or only the calls from one run ('latest' for the most recent)
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return pd.DataFrame()
+
+    # statuses stay strings even when every call in the log failed with an HTTP status code
+    calls = pd.read_json(path, lines=True, dtype={'run': str, 'status': str})
+    if calls.empty or run is None:
+        return calls
+
+    if run == 'latest':
+        run = calls['run'].iloc[-1]
+
+    return calls[calls['run'] == run]
+
+
+def call_cost(calls, prices=PRICES):
+    # estimated USD per call, missing for models without a known price
+    prompt_price = calls['model'].map(lambda model: prices.get(model, (None, None))[0]).astype(float)
+    completion_price = calls['model'].map(lambda model: prices.get(model, (None, None))[1]).astype(float)
+
+    return (calls['prompt_tokens'].fillna(0) * prompt_price
+            + calls['completion_tokens'].fillna(0) * completion_price) / 1e6
+
+
+def summarize_metrics(calls, prices=PRICES):
+    calls = calls.assign(
+        stage=calls['stage'].fillna('unknown'),
+        failed=calls['status'] != 'ok',
+        rate_limited=calls['status'] == '429',
+        cost=call_cost(calls, prices),
+    )
+
+    summary = calls.groupby('stage').agg(
+        calls=('status', 'size'),
+        failed=('failed', 'sum'),
+        rate_limited=('rate_limited', 'sum'),
+        p50_latency=('latency', lambda latency: latency.quantile(0.50)),
+        p95_latency=('latency', lambda latency: latency.quantile(0.95)),
+        p99_latency=('latency', lambda latency: latency.quantile(0.99)),
+        prompt_tokens=('prompt_tokens', 'sum'),
+        completion_tokens=('completion_tokens', 'sum'),
+        cost=('cost', 'sum'),
+    )
+    summary.loc['total'] = [
+        len(calls),
+        calls['failed'].sum(),
+        calls['rate_limited'].sum(),
+        calls['latency'].quantile(0.50),
+        calls['latency'].quantile(0.95),
+        calls['latency'].quantile(0.99),
+        calls['prompt_tokens'].sum(),
+        calls['completion_tokens'].sum(),
+        calls['cost'].sum(),
+    ]
+
+    counts = ['calls', 'failed', 'rate_limited', 'prompt_tokens', 'completion_tokens']
+    return summary.astype({column: 'int64' for column in counts})
+
+
+def print_summary(calls, prices=PRICES):
+    if calls.empty:
+        print('no calls recorded')
+        return
+
+    statuses = calls['status'].value_counts()
+    print(f'{len(calls)} calls, statuses: {", ".join(f"{status} x{count}" for status, count in statuses.items())}')
+    with pd.option_context('display.float_format', '{:,.4f}'.format, 'display.max_columns', None,
+                           'display.width', 200):
+        print(summarize_metrics(calls, prices))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', nargs='?', default=METRICS_PATH)
+    parser.add_argument('--run', default='latest', help='run id to summarize (default: the latest run)')
+    parser.add_argument('--all', action='store_true', help='summarize every recorded run together')
+    args = parser.parse_args()
+
+    print_summary(load_metrics(args.path, None if args.all else args.run))
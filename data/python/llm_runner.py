@@ -0,0 +1,245 @@
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter
+
+import openai
+from openai import AsyncOpenAI
+from tqdm import tqdm
+
+
+# **************
+# rate limiting
+# **************
+
+class TokenBucket:
+    # allows `rate` requests per second on average, with bursts of up to `capacity`
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# **************
+# retries
+# **************
+
+def is_retryable(error):
+    # retry dropped connections, timeouts, rate limits (429) and server errors (5xx)
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+
+    status = getattr(error, 'status_code', None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    # exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# **************
+# runner
+# **************
+
+async def run_requests(items, send, max_in_flight=16, requests_per_second=8.0, max_retries=5,
+                       backoff_base=1.0, backoff_cap=60.0, desc=None, on_result=None):
+    # calls `await send(item)` for every item with at most `max_in_flight` requests open at once,
+    # and returns the results in input order. items that still fail after all retries come back as None.
+    # on_result(position, result) is called as soon as each item succeeds
+    results = [None] * len(items)
+    bucket = TokenBucket(requests_per_second)
+    queue = asyncio.Queue()
+    for position, item in enumerate(items):
+        queue.put_nowait((position, item))
+
+    progress = tqdm(total=len(items), desc=desc)
+    failures = 0
+    started = time.monotonic()
+
+    async def worker():
+        nonlocal failures
+
+        while not queue.empty():
+            position, item = queue.get_nowait()
+
+            for attempt in range(max_retries + 1):
+                await bucket.acquire()
+                try:
+                    results[position] = await send(item)
+                    if on_result is not None:
+                        on_result(position, results[position])
+                    break
+                except Exception as error:
+                    if not is_retryable(error) or attempt == max_retries:
+                        failures += 1
+                        tqdm.write(f'giving up on item {position}: {error!r}')
+                        break
+                    await asyncio.sleep(backoff_delay(attempt, backoff_base, backoff_cap))
+
+            progress.update(1)
+
+    await asyncio.gather(*(worker() for _ in range(min(max_in_flight, len(items)) or 1)))
+    progress.close()
+
+    elapsed = time.monotonic() - started
+    print(f'{len(items)} requests in {elapsed:.1f}s ({len(items) / max(elapsed, 1e-9):.1f}/s), {failures} failed')
+
+    return results
+
+
+# **************
+# classification
+# **************
+
+def make_client(api_key=None, base_url=None, metrics=None, stage=None):
+    # retries are handled by run_requests, so the client itself never retries.
+    # with a llm_metrics.MetricsLog, every call (retries included) is logged under `stage`
+    client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+    if metrics is not None:
+        from llm_metrics import instrument_client
+        instrument_client(client, metrics, stage)
+
+    return client
+
+
+async def complete(client, prompt, model='gpt-4o-mini', json_mode=False):
+    # send one system prompt and return the stripped reply
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": prompt},
+        ],
+        **({'response_format': {'type': 'json_object'}} if json_mode else {}),
+    )
+
+    return response.choices[0].message.content.strip()
+
+
+def classify_titles(titles, build_prompt, model='gpt-4o-mini', api_key=None, base_url=None, on_label=None,
+                    metrics=None, stage=None, **runner_options):
+    # classify every title concurrently, returning labels in the same order as titles.
+    # on_label(position, label) is called as each label arrives
+    async def main():
+        client = make_client(api_key=api_key, base_url=base_url, metrics=metrics, stage=stage)
+        try:
+            return await run_requests(
+                list(titles),
+                lambda title: complete(client, build_prompt(title), model=model),
+                on_result=on_label,
+                **runner_options,
+            )
+        finally:
+            await client.close()
+
+    return asyncio.run(main())
+
+
+# **************
+# batched classification
+# **************
+
+def parse_batch_reply(reply, count, labels):
+    # map each index of a batch of `count` titles to its allowed label. `labels` is either the list of
+    # allowed values for a "category" field, or a dict of field name -> allowed values, in which case each
+    # index maps to a dict of labels. indices with a missing, unknown or repeated label are left out so
+    # they can be re-queued
+    fields = labels if isinstance(labels, dict) else {'category': labels}
+
+    reply = re.sub(r'^```(?:json)?|```$', '', reply.strip()).strip()
+    try:
+        data = json.loads(reply)
+    except ValueError:
+        return {}
+
+    entries = data.get('labels') if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return {}
+
+    allowed = {field: {label.lower(): label for label in values} for field, values in fields.items()}
+    seen = Counter()
+    parsed = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get('index'), int):
+            continue
+
+        index = entry['index']
+        seen[index] += 1
+        found = {field: allowed[field].get(str(entry.get(field, '')).strip(' *').lower()) for field in fields}
+        if 0 <= index < count and all(found.values()):
+            parsed[index] = found if isinstance(labels, dict) else found['category']
+
+    return {index: label for index, label in parsed.items() if seen[index] == 1}
+
+
+def classify_titles_batched(titles, build_batch_prompt, labels, build_prompt=None, batch_size=20, max_rounds=3,
+                            model='gpt-4o-mini', api_key=None, base_url=None, desc=None, on_label=None,
+                            metrics=None, stage=None, **runner_options):
+    # classify titles `batch_size` at a time with the shared instructions sent once per batch.
+    # titles that come back malformed are re-queued into new batches for up to `max_rounds`,
+    # then whatever is left falls back to one prompt per title when `build_prompt` is given.
+    # on_label(position, label) is called as each label arrives
+    titles = list(titles)
+    results = [None] * len(titles)
+
+    def record(position, label):
+        results[position] = label
+        if on_label is not None and label is not None:
+            on_label(position, label)
+
+    async def main():
+        client = make_client(api_key=api_key, base_url=base_url, metrics=metrics, stage=stage)
+
+        async def send_batch(batch):
+            reply = await complete(client, build_batch_prompt([titles[position] for position in batch]),
+                                   model=model, json_mode=True)
+            parsed = parse_batch_reply(reply, len(batch), labels)
+            for index, label in parsed.items():
+                record(batch[index], label)
+
+            return parsed
+
+        try:
+            pending = list(range(len(titles)))
+            for batch_round in range(max_rounds):
+                if not pending:
+                    break
+
+                batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+                await run_requests(batches, send_batch, desc=f'{desc or "Batches"} (round {batch_round + 1})',
+                                   **runner_options)
+
+                pending = [position for position in pending if results[position] is None]
+                print(f'{len(pending)} titles re-queued after round {batch_round + 1}')
+
+            if pending and build_prompt is not None:
+                await run_requests(
+                    [titles[position] for position in pending],
+                    lambda title: complete(client, build_prompt(title), model=model),
+                    desc=f'{desc or "Titles"} (one at a time)',
+                    on_result=lambda index, label: record(pending[index], label),
+                    **runner_options,
+                )
+        finally:
+            await client.close()
+
+    asyncio.run(main())
+
+    return results
@@ -0,0 +1,118 @@
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prompts import COMBINED_INSTRUCTIONS, THEME_LABELS, TYPE_LABELS, TYPE_INSTRUCTIONS
+
+# a local stand-in for the OpenAI chat completions endpoint, for offline throughput runs:
+#   python mock_llm_server.py --port 8000 --latency 0.2 --error-rate 0.05
+# then set base_url = 'http://127.0.0.1:8000/v1' in cluster.py. by default it answers every prompt with
+# well-formed labels, or with a fixed reply given with --reply (e.g. --reply Other to exercise re-queueing)
+
+
+def pick_label(title, labels, divisor=1):
+    # the same title always gets the same label, so reruns and cached labels agree. a different divisor
+    # keeps a title's theme and type from always landing on the same positions
+    return labels[zlib.crc32(title.encode('utf-8')) // divisor % len(labels)]
+
+
+def labelling_reply(prompt):
+    # answers cluster.py's prompts in the format they ask for: a JSON object of labels for batched
+    # prompts (theme and type for the combined prompt), or just the category name for a single title
+    labels = TYPE_LABELS if TYPE_INSTRUCTIONS in prompt else THEME_LABELS
+
+    entries = []
+    for line in prompt.splitlines():
+        index, _, title = line.strip().partition(': ')
+        if index.isdigit() and title.startswith('"'):
+            title = json.loads(title)
+            if COMBINED_INSTRUCTIONS in prompt:
+                entries.append({
+                    'index': int(index),
+                    'theme': pick_label(title, THEME_LABELS),
+                    'type': pick_label(title, TYPE_LABELS, divisor=len(THEME_LABELS)),
+                })
+            else:
+                entries.append({'index': int(index), 'category': pick_label(title, labels)})
+
+    if entries:
+        return json.dumps({'labels': entries})
+
+    # the title without its quotes, so it gets the same label it would in a batch
+    title = prompt.rpartition("Here's the title to categorize:")[2].strip()[1:-1]
+    return pick_label(title, labels)
+
+
+def make_handler(reply, latency, error_rate):
+
+    class MockCompletionsHandler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            time.sleep(random.uniform(0.5, 1.5) * latency)
+
+            # inject rate limits and server errors so retries get exercised
+            if random.random() < error_rate:
+                status = random.choice([429, 500, 503])
+                return self.respond(status, {'error': {'message': 'mock failure', 'code': status}})
+
+            prompt = ' '.join(message['content'] for message in body.get('messages', []))
+            content = reply(prompt) if callable(reply) else reply
+
+            self.respond(200, {
+                'id': 'mock',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'mock'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {
+                    'prompt_tokens': len(prompt) // 4,
+                    'completion_tokens': len(content) // 4,
+                    'total_tokens': (len(prompt) + len(content)) // 4,
+                },
+            })
+
+        def respond(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MockCompletionsHandler
+
+
+def start_mock_server(port=0, reply=labelling_reply, latency=0.2, error_rate=0.0):
+    # serve in a background thread, returning the server and its base_url
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(reply, latency, error_rate))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--reply', default=None, help='fixed reply to every request (default: valid labels)')
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(
+        labelling_reply if args.reply is None else args.reply, args.latency, args.error_rate
+    ))
+    print(f'mock chat completions server on http://127.0.0.1:{args.port}/v1')
+    server.serve_forever()
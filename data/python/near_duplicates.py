@@ -0,0 +1,88 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# minhash values are (a * x + b) mod this prime, which keeps a * x inside int64
+PRIME = (1 << 31) - 1
+
+
+# **************
+# minhash
+# **************
+
+def shingles(title, size=5):
+    # overlapping character shingles of the lowercased, whitespace-collapsed title
+    text = ' '.join(str(title).lower().split())
+    if len(text) <= size:
+        return {text}
+
+    return {text[start:start + size] for start in range(len(text) - size + 1)}
+
+
+def minhash(title_shingles, a, b):
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in title_shingles), dtype=np.int64)
+    return ((np.outer(a, hashes) + b[:, None]) % PRIME).min(axis=1)
+
+
+def jaccard(first, second):
+    return len(first & second) / len(first | second)
+
+
+# **************
+# grouping
+# **************
+
+def near_duplicate_groups(titles, threshold=0.8, shingle_size=5, bands=16, rows_per_band=4, seed=42):
+    # greedy grouping: each title joins the most similar earlier representative whose shingle jaccard
+    # similarity is at least `threshold`, or becomes a representative itself. minhash LSH keeps the
+    # candidate representatives per title small, and every similarity is checked exactly
+    titles = pd.Series(titles)
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, PRIME, bands * rows_per_band, dtype=np.int64)
+    b = rng.integers(0, PRIME, bands * rows_per_band, dtype=np.int64)
+
+    buckets = {}
+    representative_shingles = {}
+    representatives = np.empty(len(titles), dtype=np.int64)
+    similarities = np.ones(len(titles))
+
+    for position, title in enumerate(titles):
+        title_shingles = shingles(title, shingle_size)
+        signature = minhash(title_shingles, a, b)
+        band_keys = [(band, signature[band * rows_per_band:(band + 1) * rows_per_band].tobytes())
+                     for band in range(bands)]
+
+        candidates = {candidate for key in band_keys for candidate in buckets.get(key, ())}
+        best, best_similarity = position, 0.0
+        for candidate in candidates:
+            similarity = jaccard(title_shingles, representative_shingles[candidate])
+            if similarity >= threshold and similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+
+        representatives[position] = best
+        if best == position:
+            representative_shingles[position] = title_shingles
+            for key in band_keys:
+                buckets.setdefault(key, []).append(position)
+        else:
+            similarities[position] = best_similarity
+
+    groups = pd.DataFrame({
+        'representative': representatives,
+        'representative_title': titles.to_numpy()[representatives],
+        'similarity': similarities,
+    }, index=titles.index)
+
+    print(f'{len(titles)} titles collapse to {len(representative_shingles)} near-duplicate groups '
+          f'at similarity >= {threshold}')
+
+    return groups
+
+
+def propagate_labels(labels, groups):
+    # fill each member's missing label from its representative
+    labels = pd.Series(labels, dtype=object)
+    from_representative = pd.Series(labels.to_numpy()[groups['representative'].to_numpy()], index=labels.index)
+
+    return labels.fillna(from_representative)
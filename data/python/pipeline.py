@@ -0,0 +1,265 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from ingest import file_hash
+
+# runs the analysis scripts in dependency order, skipping any stage whose scripts and inputs haven't
+# changed since it last succeeded, and running independent stages side by side:
+#   python pipeline.py              # everything that's stale
+#   python pipeline.py analyze      # analyze and whatever it depends on
+#   python pipeline.py --force classify --dry-run
+#   python pipeline.py --jobs 1
+# paths are relative to data/python, like the scripts themselves
+
+STATE_PATH = '../processed/pipeline_state.json'
+LOG_DIR = '../processed/logs'
+
+STAGES = {
+    'ingest': {
+        'script': 'ingest.py',
+        'inputs': ['../raw/photos.json'],
+        'outputs': ['../processed/photos.parquet'],
+    },
+    'clean': {
+        'script': 'title_clean.py',
+        'inputs': ['../processed/photos.parquet'],
+        'outputs': ['../../static/data/cleaned_titles.csv'],
+    },
+    'keywords': {
+        'script': 'keyword_analysis.py',
+        'inputs': ['../processed/photos.parquet'],
+        'outputs': [
+            '../../static/data/top_three_words.csv',
+            '../../static/data/top_words.csv',
+            '../../static/data/keyword_summary.csv',
+            '../../static/data/cleaned_titles_with_keywords.csv',
+            '../../static/data/top_keywords_by_group.csv',
+        ],
+    },
+    'embed': {
+        'script': 'investigate.py',
+        'inputs': ['../processed/photos.parquet'],
+        'outputs': ['../processed/remaining_photos.csv', '../processed/cluster_centroids.npy'],
+    },
+    'classify': {
+        'script': 'cluster.py',
+        'inputs': ['../../static/data/cleaned_titles.csv'],
+        'outputs': ['../../static/data/theme_classified_titles.csv', '../../static/data/type_classified_titles.csv'],
+    },
+    'analyze': {
+        'script': 'cluster_analysis.py',
+        'inputs': [
+            '../../static/data/theme_classified_titles.csv',
+            '../../static/data/type_classified_titles.csv',
+            '../../static/data/cleaned_titles.csv',
+        ],
+        'outputs': ['../../static/data/cleaned_titles_with_themes_and_types.csv'],
+    },
+    'export': {
+        'script': 'export_bundle.py',
+        'inputs': ['../../static/data/cleaned_titles_with_themes_and_types.csv', '../../static/data/top_three_words.csv'],
+        'outputs': ['../../static/data/bundle.json', '../../static/data/search_index.json'],
+    },
+}
+
+
+# **************
+# dependencies
+# **************
+
+def upstream_stages(stages):
+    # a stage depends on every stage that writes one of its inputs
+    producers = {os.path.normpath(output): name for name, stage in stages.items() for output in stage['outputs']}
+
+    return {
+        name: sorted({producers[os.path.normpath(path)] for path in stage['inputs'] if os.path.normpath(path) in producers})
+        for name, stage in stages.items()
+    }
+
+
+def with_upstream(targets, upstream):
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(upstream[name])
+
+    return selected
+
+
+def local_modules(script, seen=None):
+    # the script plus every module it imports from this directory, so editing a helper reruns its users
+    seen = set() if seen is None else seen
+    if script in seen or not os.path.exists(script):
+        return seen
+    seen.add(script)
+
+    with open(script, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            local_modules(f'{name.split(".")[0]}.py', seen)
+
+    return seen
+
+
+# **************
+# fingerprints
+# **************
+
+def stage_fingerprint(stage):
+    digest = hashlib.sha256()
+    for path in sorted(local_modules(stage['script'])) + stage['inputs']:
+        digest.update(path.encode('utf-8'))
+        digest.update(file_hash(path).encode('ascii') if os.path.exists(path) else b'missing')
+
+    return digest.hexdigest()
+
+
+def output_hashes(stage):
+    return {path: file_hash(path) for path in stage['outputs'] if os.path.exists(path)}
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_stale(stage, record, fingerprint):
+    # stale if its scripts or inputs changed, or its outputs are missing or were changed by something else
+    if record is None or record['fingerprint'] != fingerprint:
+        return True
+
+    return output_hashes(stage) != record['outputs'] or len(record['outputs']) != len(stage['outputs'])
+
+
+# **************
+# running
+# **************
+
+def run_stage(name, stage, log_dir=LOG_DIR):
+    # scripts run in their own process from this directory, with output going to a per-stage log
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f'{name}.log')
+
+    started = time.monotonic()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        result = subprocess.run([sys.executable, stage['script']], stdout=log, stderr=subprocess.STDOUT)
+
+    return result.returncode, time.monotonic() - started, log_path
+
+
+def run_pipeline(stages=STAGES, targets=None, force=(), jobs=None, dry_run=False, state_path=STATE_PATH):
+    upstream = upstream_stages(stages)
+    selected = with_upstream(targets or stages, upstream)
+    state = load_state(state_path)
+
+    done, failed = set(), set()
+    running = {}
+    fingerprints = {}
+    results = {}
+
+    with ThreadPoolExecutor(jobs or len(selected)) as pool:
+        while len(done) + len(failed) < len(selected):
+            for name in sorted(selected - done - failed - set(running.values())):
+                if any(dependency in failed for dependency in upstream[name]):
+                    print(f'{name}: skipped, an upstream stage failed')
+                    failed.add(name)
+                    results[name] = 'skipped'
+                    continue
+                if not all(dependency in done for dependency in upstream[name]):
+                    continue
+
+                # fingerprinted only once everything upstream has finished writing its outputs
+                fingerprint = stage_fingerprint(stages[name])
+                would_rerun_upstream = any(results[dependency] == 'stale' for dependency in upstream[name])
+                if name not in force and not would_rerun_upstream and not is_stale(stages[name], state.get(name), fingerprint):
+                    print(f'{name}: up to date')
+                    done.add(name)
+                    results[name] = 'fresh'
+                    continue
+
+                if dry_run:
+                    print(f'{name}: would run {stages[name]["script"]}')
+                    done.add(name)
+                    results[name] = 'stale'
+                    continue
+
+                missing = [path for path in stages[name]['inputs'] if not os.path.exists(path)]
+                if missing:
+                    print(f'{name}: missing inputs {missing}')
+                    failed.add(name)
+                    results[name] = 'failed'
+                    continue
+
+                print(f'{name}: running {stages[name]["script"]}')
+                running[pool.submit(run_stage, name, stages[name])] = name
+                # record the fingerprint the stage started from, so edits made while it runs aren't missed
+                fingerprints[name] = fingerprint
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                returncode, elapsed, log_path = future.result()
+
+                if returncode == 0:
+                    state[name] = {
+                        'fingerprint': fingerprints[name],
+                        'outputs': output_hashes(stages[name]),
+                    }
+                    save_state(state, state_path)
+                    print(f'{name}: finished in {elapsed:.1f}s')
+                    done.add(name)
+                    results[name] = 'ran'
+                else:
+                    print(f'{name}: failed with exit code {returncode} after {elapsed:.1f}s, see {log_path}')
+                    failed.add(name)
+                    results[name] = 'failed'
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('stages', nargs='*', help=f'stages to bring up to date, from {", ".join(STAGES)} (default: all)')
+    parser.add_argument('--force', action='append', default=[], choices=list(STAGES), help='rerun this stage even if fresh')
+    parser.add_argument('--jobs', type=int, default=None, help='stages to run at once (default: as many as are ready)')
+    parser.add_argument('--dry-run', action='store_true', help='print what would run without running it')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.stages if name not in STAGES]
+    if unknown:
+        parser.error(f'unknown stages: {", ".join(unknown)}')
+
+    results = run_pipeline(STAGES, args.stages, set(args.force), args.jobs, args.dry_run)
+    sys.exit(1 if 'failed' in results.values() else 0)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+
+
+# **************
+# embedding pre-classifier
+# **************
+
+def fit_pre_classifier(embeddings, labels, min_examples=50):
+    # logistic regression on the embeddings of titles that already have a valid LLM label
+    known = labels.notna().to_numpy()
+    if known.sum() < min_examples or labels[known].nunique() < 2:
+        return None
+
+    model = LogisticRegression(max_iter=1000)
+    model.fit(embeddings[known], labels[known].to_numpy())
+
+    return model
+
+
+def predict_confident(model, embeddings, threshold):
+    # the most likely label where its probability clears the threshold, None elsewhere
+    probabilities = model.predict_proba(embeddings)
+    confidence = probabilities.max(axis=1)
+    predicted = model.classes_[probabilities.argmax(axis=1)].astype(object)
+    predicted[confidence < threshold] = None
+
+    return predicted, confidence
+
+
+def holdout_report(embeddings, labels, threshold, test_size=0.2):
+    # accuracy and coverage at the threshold on held-out labeled titles, to help pick the threshold
+    known = labels.notna().to_numpy()
+    train, test = train_test_split(np.flatnonzero(known), test_size=test_size, random_state=42)
+
+    model = fit_pre_classifier(embeddings[train], labels.iloc[train])
+    if model is None or len(test) == 0:
+        return None
+
+    predicted, _ = predict_confident(model, embeddings[test], threshold)
+    confident = pd.notna(predicted)
+    accuracy = (predicted[confident] == labels.iloc[test].to_numpy()[confident]).mean() if confident.any() else np.nan
+
+    return {'coverage': confident.mean(), 'accuracy': accuracy}
+
+
+def pre_classify_missing(embeddings, labels, allowed, threshold=0.9, name='label'):
+    # fill missing labels locally wherever the classifier is confident, training on the existing
+    # labels that are one of the allowed values. everything else is left missing for the LLM
+    labels = pd.Series(labels, dtype=object)
+    training_labels = labels.where(labels.isin(allowed))
+    missing = labels.isna().to_numpy()
+
+    if not missing.any():
+        print(f'{name}: every title already has a label, nothing to pre-classify')
+        return labels, 0
+
+    model = fit_pre_classifier(embeddings, training_labels)
+    if model is None:
+        print(f'{name}: not enough labeled titles to pre-classify, sending {missing.sum()} titles to the LLM')
+        return labels, 0
+
+    report = holdout_report(embeddings, training_labels, threshold)
+    if report is not None:
+        print(f'{name}: held-out accuracy {report["accuracy"]:.1%} on the {report["coverage"]:.1%} '
+              f'of titles above confidence {threshold}')
+
+    predicted, _ = predict_confident(model, embeddings[missing], threshold)
+    filled = labels.copy()
+    filled[missing] = predicted
+    saved = int(pd.notna(predicted).sum())
+
+    print(f'{name}: pre-classified {saved} of {missing.sum()} unlabeled titles locally, '
+          f'{missing.sum() - saved} left for the LLM')
+
+    return filled, saved
@@ -0,0 +1,138 @@
+import json
+
+# **************
+# classification prompts
+# **************
+
+# shared category instructions, followed by either one title or a numbered batch of titles
+
+CATEGORIZATION_INTRO = """
+    You are a text categorization assistant. Your task is to categorize website titles from the military. The titles have recently been erased, and I want to group them into categories. You need to group each title into one of the following groups based on its content:
+
+"""
+
+THEME_CATEGORIES = """    1. Black: Titles with events, figures, or topics related to Black people. For example, titles related to Black History Month, African Americans, Juneteenth, the Tuskegee Airmen, etc.
+    2. Women: Titles relating to women/females, including both women's cultural events like women's history month, and events specifically for/about female military personnel.
+    3. Hispanic: Titles with events, figures, or topics related to Hispanic/Latino people. For example, titles related to Hispanic Heritage Month, Hispanic soldiers, Latin food, fiestas, etc.
+    4. Native American: Titles with events, figures, or topics related to Native American/Indigenous people. For example, titles related to Native American Heritage Month, indigenous soldiers, the Navajo code talkers, powwows, various native tribes, etc.
+    5. Asian or Pacific Islander: Titles with events, figures, or topics related to Asian and Pacific Islander people. For example, titles related to Asian Heritage Month, Asian soldiers, Asian food, Luaus, etc.
+    6. LGBTQ+: Titles with events, figures, or topics related to LGBTQ+ people. For example, titles related to Pride Month, the LGBTQ+ community, the Stonewall Riots, etc. 
+    7. Other ethnicities & religions: Titles with events, figures, or topics related to other ethnicities and religions not mentioned above (e.g. not black, not hispanic, not native american, not asian, not pacific islander, not LGBTQ+). For example, titles related to Jewish Heritage Month, the Holocaust, Irish American Heritage, German American Heritage, Iraqi heritage, etc.
+    8. Generic DEI: Titles with events, figures, or topics related to diversity and inclusion, but not a specific racial or ethnic group. For example, titles related to diversity training, unconscious bias, equal employment, inclusivity, unspecified heritage, immigrants from unspecified places, barriers being broken, first-time achievements, etc.
+    9. Other: Titles that don't fit into any of the above categories. 
+
+"""
+
+THEME_GUIDANCE = """    For each title, respond with just the  category name. Make sure to consider a title's context and meaning, and also whether titles were flagged for removal by accident. For example, a title about "Enola Gay" should be categorized as *LGBTQ+* because, even though it's about a plane, the plane's name has "gay" in it and that's probably why it was flagged. Another example: a title about "Vance Marchbanks" should be categorized as *Black* because, even though "black" isn't in the name, it's about a Black soldier.
+
+"""
+
+TYPE_CATEGORIES = """    1. Explicit heritage and DEI events: Titles that celebrate a specific heritage month or event, or an explicit Diversity, Equity, and Inclusion (DEI) program. For example, titles related to Black History Month, Hispanic Heritage Month, Native American Heritage Month, Asian Heritage Month, Inclusivity workshops, etc.
+    2. Everyday celebrations of heritage or ethnicity: Titles that mention activities or celebrations related to a specific heritage group without explicitly mentioning a heritage month or event. For example, titles related to Asian food, gospel music, female-led movies, fiestas, powwows, etc.
+    3. Mentions of personnel that highlight their ethnicity: any mentions of military personnel that call out the fact that these personnel are black, hispanic, native american, asian, etc.
+    4. Military personnel that belong to a specific ethnic group, even if that isn't explicitly mentioned: Titles that mention military personnel who happen to a specific heritage group, even if that isn't in the title. For example, titles like Vance Marchbanks (who is black), the code talkers (who are native American), Nishimoto (who is asian), Eric Fanning (who is gay), etc.
+    5. Facts of history that relate to a specific ethnic group: Titles that mention facts of history that relate to a specific ethnic group. For example, titles related to slavery, the civil rights movement, the holocaust (but not an official observence event, which would be in category #1), the niagara movement, etc.
+    6. Other: Titles that don't fit into any of the above categories.
+
+"""
+
+TYPE_GUIDANCE = """    For each title, respond with just the  category name (don't include the number).
+
+"""
+
+THEME_INSTRUCTIONS = CATEGORIZATION_INTRO + THEME_CATEGORIES + THEME_GUIDANCE
+
+TYPE_INSTRUCTIONS = CATEGORIZATION_INTRO + TYPE_CATEGORIES + TYPE_GUIDANCE
+
+# both classifications in one request, answered as JSON
+COMBINED_INSTRUCTIONS = ("""
+    You are a text categorization assistant. Your task is to categorize website titles from the military. The titles have recently been erased, and I want to group them into categories. You need to give each title both a theme and a type based on its content.
+
+    The theme is one of the following groups:
+
+"""
+    + THEME_CATEGORIES
+    + """    The type is one of the following groups:
+
+"""
+    + TYPE_CATEGORIES
+    + """    Make sure to consider a title's context and meaning, and also whether titles were flagged for removal by accident. For example, a title about "Enola Gay" should have the theme *LGBTQ+* because, even though it's about a plane, the plane's name has "gay" in it and that's probably why it was flagged. Another example: a title about "Vance Marchbanks" should have the theme *Black* because, even though "black" isn't in the name, it's about a Black soldier.
+
+""")
+
+
+# allowed labels for each classification, as named in the instructions
+THEME_LABELS = [
+    'Black',
+    'Women',
+    'Hispanic',
+    'Native American',
+    'Asian or Pacific Islander',
+    'LGBTQ+',
+    'Other ethnicities & religions',
+    'Generic DEI',
+    'Other',
+]
+
+TYPE_LABELS = [
+    'Explicit heritage and DEI events',
+    'Everyday celebrations of heritage or ethnicity',
+    'Mentions of personnel that highlight their ethnicity',
+    "Military personnel that belong to a specific ethnic group, even if that isn't explicitly mentioned",
+    'Facts of history that relate to a specific ethnic group',
+    'Other',
+]
+
+SINGLE_TITLE = """    Here's the title to categorize: "{text}"
+    """
+
+BATCH_TITLES = """    Here are the titles to categorize, one per line as index: "title":
+
+{titles}
+
+    Respond with a JSON object of the form {{"labels": [{{"index": 0, "category": "<category name>"}}, ...]}}, with exactly one entry for every index above, and each category written exactly as one of the category names listed (without the number).
+    """
+
+
+def format_batch(titles):
+    return '\n'.join(f'    {index}: {json.dumps(title)}' for index, title in enumerate(titles))
+
+
+def theme_prompt(text):
+    return THEME_INSTRUCTIONS + SINGLE_TITLE.format(text=text)
+
+
+def type_prompt(text):
+    return TYPE_INSTRUCTIONS + SINGLE_TITLE.format(text=text)
+
+
+def theme_batch_prompt(texts):
+    return THEME_INSTRUCTIONS + BATCH_TITLES.format(titles=format_batch(texts))
+
+
+def type_batch_prompt(texts):
+    return TYPE_INSTRUCTIONS + BATCH_TITLES.format(titles=format_batch(texts))
+
+
+COMBINED_BATCH_TITLES = """    Here are the titles to categorize, one per line as index: "title":
+
+{titles}
+
+    Respond with a JSON object of the form {{"labels": [{{"index": 0, "theme": "<theme name>", "type": "<type name>"}}, ...]}}, with exactly one entry for every index above, and each theme and type written exactly as one of the names listed (without the number).
+    """
+
+
+def combined_batch_prompt(texts):
+    # a batch of one title is the single-title combined prompt
+    return COMBINED_INSTRUCTIONS + COMBINED_BATCH_TITLES.format(titles=format_batch(texts))
+
+
+# **************
+# label cache keys
+# **************
+
+# what the label cache keys each label on: the instructions plus every template a title can be sent in, so
+# editing either invalidates the labels it shaped, while one-title and batched prompts still share entries
+THEME_CACHE_PROMPT = THEME_INSTRUCTIONS + SINGLE_TITLE + BATCH_TITLES
+TYPE_CACHE_PROMPT = TYPE_INSTRUCTIONS + SINGLE_TITLE + BATCH_TITLES
+COMBINED_CACHE_PROMPT = COMBINED_INSTRUCTIONS + COMBINED_BATCH_TITLES
@@ -0,0 +1,37 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# words are runs of letters, digits and underscores, like the \p{L}\p{N}_ pattern title_search.svelte
+# splits queries with
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(title):
+    return TOKEN_PATTERN.findall(str(title).lower())
+
+
+def delta_encode(row_ids):
+    # sorted row ids as gaps from the previous id, so long posting lists are mostly small numbers
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    return np.diff(row_ids, prepend=0).tolist()
+
+
+def build_search_index(titles, facets):
+    # token -> rows containing it, with tokens sorted so the frontend can binary search a prefix
+    # range, plus the rows in each value of every facet (e.g. each theme code)
+    tokens = pd.DataFrame(
+        [(row, token) for row, title in enumerate(titles) if pd.notna(title) for token in set(tokenize(title))],
+        columns=['row', 'token'],
+    )
+    postings = tokens.sort_values(['token', 'row']).groupby('token', sort=True)['row']
+
+    return {
+        'tokens': list(postings.groups.keys()),
+        'postings': [delta_encode(rows) for _, rows in postings],
+        'facets': {
+            name: [delta_encode(np.flatnonzero(np.asarray(codes) == code)) for code in range(max(codes, default=-1) + 1)]
+            for name, codes in facets.items()
+        },
+    }
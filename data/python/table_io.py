@@ -0,0 +1,86 @@
+import hashlib
+import os
+
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+
+# stages write every table as CSV, which is what the frontend fetches from static/data, and also as
+# parquet under data/processed/tables with the label columns stored as categoricals. read_table uses
+# the parquet copy whenever it was written alongside the CSV that's currently on disk
+WRITE_COLUMNAR = True
+COLUMNAR_DIR = '../processed/tables'
+
+# long strings repeated across thousands of rows
+CATEGORICAL_COLUMNS = ['theme', 'type', 'top_keyword_group', 'cluster', 'keyword_group']
+
+
+def columnar_path(csv_path, columnar_dir=COLUMNAR_DIR):
+    # named after the CSV and its directory, so same-named CSVs in different directories get separate copies
+    directory = hashlib.sha1(os.path.dirname(os.path.abspath(csv_path)).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(columnar_dir, f'{os.path.splitext(os.path.basename(csv_path))[0]}-{directory}.parquet')
+
+
+def csv_signature(csv_path):
+    # size and modification time are enough to tell that the CSV was rewritten or edited by hand
+    stat = os.stat(csv_path)
+    return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def as_read_back(df):
+    # the strings read_csv reads back as missing (empty strings, "NA", "NULL" and the like) as missing values
+    df = df.copy()
+    for column in df.columns:
+        if pd.api.types.is_object_dtype(df[column]) or pd.api.types.is_string_dtype(df[column]):
+            df[column] = df[column].mask(df[column].isin(STR_NA_VALUES))
+
+    return df
+
+
+def with_categoricals(df):
+    df = df.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+
+    return df
+
+
+def write_table(df, csv_path, columnar=None, columnar_dir=COLUMNAR_DIR):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # written next to the destination and renamed over it, so an interrupted write never leaves a
+    # truncated table behind
+    tmp_path = csv_path + '.tmp'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, csv_path)
+
+    if not (WRITE_COLUMNAR if columnar is None else columnar):
+        return
+
+    # the parquet copy has the same missing values read_csv would give back (e.g. "NULL" urls read as
+    # missing), so stages see the same data whichever copy they read
+    table = pa.Table.from_pandas(with_categoricals(as_read_back(df)), preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b'csv_signature': csv_signature(csv_path).encode('utf-8'),
+    })
+
+    path = columnar_path(csv_path, columnar_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_table(csv_path, columnar_dir=COLUMNAR_DIR):
+    # the parquet copy if it matches the CSV, otherwise the CSV itself
+    import pyarrow.parquet as pq
+
+    path = columnar_path(csv_path, columnar_dir)
+    if os.path.exists(path) and os.path.exists(csv_path):
+        metadata = pq.read_schema(path).metadata or {}
+        if metadata.get(b'csv_signature', b'').decode('utf-8') == csv_signature(csv_path):
+            return pd.read_parquet(path)
+
+    return pd.read_csv(csv_path)
@@ -0,0 +1,35 @@
+from llm_metrics import MetricsLog, load_metrics, summarize_metrics
+
+# run from data/python with: python -m pytest test_llm_metrics.py
+
+
+def log_calls(path, statuses, stage='theme'):
+    log = MetricsLog(str(path))
+    for status in statuses:
+        log.record(time=0.0, stage=stage, model='gpt-4o-mini', status=status, latency=0.5,
+                   prompt_tokens=None, completion_tokens=None)
+    log.close()
+    return log.run
+
+
+def test_all_rate_limited_run(tmp_path):
+    # a run where every call hit a rate limit has only numeric-looking statuses
+    path = tmp_path / 'llm_calls.jsonl'
+    run = log_calls(path, ['429'] * 5)
+
+    summary = summarize_metrics(load_metrics(str(path), run))
+
+    assert summary.loc['theme', 'calls'] == 5
+    assert summary.loc['theme', 'failed'] == 5
+    assert summary.loc['theme', 'rate_limited'] == 5
+    assert summary.loc['total', 'rate_limited'] == 5
+
+
+def test_mixed_statuses(tmp_path):
+    path = tmp_path / 'llm_calls.jsonl'
+    run = log_calls(path, ['ok', 'ok', '429', '500', 'APITimeoutError'])
+
+    summary = summarize_metrics(load_metrics(str(path), run))
+
+    assert summary.loc['theme', 'failed'] == 3
+    assert summary.loc['theme', 'rate_limited'] == 1
@@ -0,0 +1,42 @@
+/**
+ * Loads the compact data bundle written by data/python/export_bundle.py
+ */
+import { getDataPath } from "./paths";
+
+let bundlePromise;
+
+/**
+ * Fetches bundle.json once and shares it between every component that needs it
+ * @returns {Promise<object>} The parsed bundle
+ */
+export function loadBundle() {
+  if (!bundlePromise) {
+    bundlePromise = fetch(getDataPath("bundle.json")).then((response) => {
+      if (!response.ok) {
+        throw new Error(`Failed to load bundle.json: ${response.status}`);
+      }
+      return response.json();
+    });
+  }
+  return bundlePromise;
+}
+
+/**
+ * Expands the bundle's dictionary-encoded columns into row objects, shaped like the d3.csv rows the
+ * components used to load (missing values are empty strings)
+ * @param {object} bundle - The bundle returned by loadBundle
+ * @returns {{title: string, theme: string, type: string, url: string}[]} One object per title
+ */
+export function bundleRows(bundle) {
+  const { columns, themes, types, url_prefixes } = bundle;
+
+  return columns.title.map((title, i) => ({
+    title,
+    theme: columns.theme[i] >= 0 ? themes[columns.theme[i]] : "",
+    type: columns.type[i] >= 0 ? types[columns.type[i]] : "",
+    url:
+      columns.url_prefix[i] >= 0
+        ? url_prefixes[columns.url_prefix[i]] + columns.url_suffix[i]
+        : "",
+  }));
+}
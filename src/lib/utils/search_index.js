@@ -0,0 +1,171 @@
+/**
+ * Title search over the inverted index written by data/python/export_bundle.py
+ */
+import { getDataPath } from "./paths";
+
+let indexPromise;
+
+/**
+ * Fetches search_index.json once
+ * @returns {Promise<object>} The parsed index, with a cache for decoded posting lists
+ */
+export function loadSearchIndex() {
+  if (!indexPromise) {
+    indexPromise = fetch(getDataPath("search_index.json")).then((response) => {
+      if (!response.ok) {
+        throw new Error(`Failed to load search_index.json: ${response.status}`);
+      }
+      return response.json().then((index) => ({ ...index, decoded: new Map() }));
+    });
+  }
+  return indexPromise;
+}
+
+/**
+ * Splits text into lowercase words, the same way the index was built
+ * @param {string} text - A title or search query
+ * @returns {string[]} The words
+ */
+export function tokenize(text) {
+  return text.toLowerCase().match(/[\p{L}\p{N}_]+/gu) || [];
+}
+
+// Row ids from a delta-encoded posting list
+function decodePostings(deltas) {
+  const rows = new Int32Array(deltas.length);
+  let row = 0;
+  for (let i = 0; i < deltas.length; i++) {
+    row += deltas[i];
+    rows[i] = row;
+  }
+  return rows;
+}
+
+function tokenRows(index, position) {
+  if (!index.decoded.has(position)) {
+    index.decoded.set(position, decodePostings(index.postings[position]));
+  }
+  return index.decoded.get(position);
+}
+
+/**
+ * Row ids in one value of a facet, e.g. every row with a given theme code
+ * @param {object} index - The index returned by loadSearchIndex
+ * @param {string} facet - The facet name ("theme" or "type")
+ * @param {number} code - The value's position in the bundle's label list
+ * @returns {Int32Array} Sorted row ids
+ */
+export function facetRows(index, facet, code) {
+  const key = `${facet}:${code}`;
+  if (!index.decoded.has(key)) {
+    index.decoded.set(key, decodePostings(index.facets[facet][code] || []));
+  }
+  return index.decoded.get(key);
+}
+
+// Positions of the index tokens that start with prefix, found by binary search on the sorted tokens
+function prefixRange(tokens, prefix) {
+  let low = 0;
+  let high = tokens.length;
+  while (low < high) {
+    const mid = (low + high) >> 1;
+    if (tokens[mid] < prefix) low = mid + 1;
+    else high = mid;
+  }
+
+  let end = low;
+  while (end < tokens.length && tokens[end].startsWith(prefix)) end++;
+  return [low, end];
+}
+
+// Sorted, duplicate-free union of sorted row id lists
+function unionRows(lists) {
+  if (lists.length === 1) return lists[0];
+
+  const merged = new Int32Array(lists.reduce((size, list) => size + list.length, 0));
+  let offset = 0;
+  for (const list of lists) {
+    merged.set(list, offset);
+    offset += list.length;
+  }
+  merged.sort();
+
+  let size = 0;
+  for (let i = 0; i < merged.length; i++) {
+    if (size === 0 || merged[i] !== merged[size - 1]) merged[size++] = merged[i];
+  }
+  return merged.subarray(0, size);
+}
+
+// Rows in both sorted lists, walking the shorter list and galloping through the longer one
+function intersectRows(shorter, longer) {
+  const rows = [];
+  let low = 0;
+  for (const row of shorter) {
+    // widen the window until it passes row, then binary search inside it
+    let high = low;
+    let step = 1;
+    while (high < longer.length && longer[high] < row) {
+      low = high + 1;
+      high += step;
+      step *= 2;
+    }
+    high = Math.min(high, longer.length);
+    while (low < high) {
+      const mid = (low + high) >> 1;
+      if (longer[mid] < row) low = mid + 1;
+      else high = mid;
+    }
+
+    if (low === longer.length) break;
+    if (longer[low] === row) rows.push(row);
+  }
+  return rows;
+}
+
+/**
+ * Rows matching a query and the selected facet values. Every query word must start a word in the
+ * title, or start a word of the row's theme or type. Only the posting lists of the query words and
+ * facets are read, so the cost follows the number of matching rows rather than the corpus size
+ * @param {object} index - The index returned by loadSearchIndex
+ * @param {object} bundle - The bundle returned by loadBundle
+ * @param {{query?: string, theme?: number, type?: number}} filters - Query text and facet codes (-1 or undefined for all)
+ * @returns {number[]} Matching row ids in their original order
+ */
+export function searchRows(index, bundle, { query = "", theme = -1, type = -1 } = {}) {
+  // one sorted row list per condition
+  const conditions = [];
+
+  for (const word of new Set(tokenize(query))) {
+    const lists = [];
+
+    const [start, end] = prefixRange(index.tokens, word);
+    for (let position = start; position < end; position++) lists.push(tokenRows(index, position));
+
+    // words can also name a group or content type, e.g. "women" or "heritage"
+    for (const [facet, labels] of [["theme", bundle.themes], ["type", bundle.types]]) {
+      labels.forEach((label, code) => {
+        if (tokenize(label).some((token) => token.startsWith(word))) lists.push(facetRows(index, facet, code));
+      });
+    }
+
+    conditions.push(unionRows(lists));
+  }
+
+  for (const [facet, code] of [["theme", theme], ["type", type]]) {
+    if (code === undefined || code < 0) continue;
+    conditions.push(facetRows(index, facet, code));
+  }
+
+  // no filters: every row
+  if (conditions.length === 0) return Array.from({ length: bundle.total }, (_, row) => row);
+
+  // intersect from the shortest list, so each step only touches rows that are still candidates
+  conditions.sort((a, b) => a.length - b.length);
+  let rows = conditions[0];
+  for (const other of conditions.slice(1)) {
+    if (rows.length === 0) break;
+    rows = intersectRows(rows, other);
+  }
+  return Array.from(rows);
+}